@@ -3,6 +3,8 @@
 #   flask --app mock_api.py run --debug --port 5001
 # Then add API URL to .env:
 #   API_URL="http://localhost:5001/{title}/{artist}/"
+# And optionally the batch API URL:
+#   API_BATCH_URL="http://localhost:5001/batch/"
 
 SONGS = {
     'song 1': {
@@ -22,7 +24,7 @@ SONGS = {
     },
 }
 
-from flask import Flask
+from flask import Flask, request
 app = Flask(__name__)
 
 @app.get('/<string:title>/')
@@ -32,3 +34,7 @@ def api(title, artist=None):
         return SONGS[title.lower()]
     else:
         return {}
+
+@app.post('/batch/')
+def batch_api():
+    return [SONGS.get(x['title'].lower()) for x in request.json]
@@ -1,17 +1,61 @@
 from flask import Flask, render_template
 from dotenv import load_dotenv
+import os
 
 def error_404(e):
     return render_template('error.html', message='404 Not Found',
         title='Not Found'), 404
 
+def error_503(e):
+    return render_template('error.html', message='503 Service Unavailable',
+        title='Service Unavailable'), 503, { 'Retry-After': '10' }
+
 def create_app():
     app = Flask(__name__)
 
     load_dotenv()
 
+    # Stream step 2 songs as their lyrics are found
+    app.config['STREAM_LYRICS'] = os.getenv('STREAM_LYRICS', '') != ''
+
+    # Return partial step 2 results if lyrics lookups take too long
+    app.config['LOOKUP_DEADLINE'] = \
+        float(os.getenv('LOOKUP_DEADLINE', 25)) or None
+
+    # Recreate lyrics API client, cache, cleaning rules, and circuit breaker
+    # from the (possibly updated) environment
+    from . import core
+    core.set_client(None)
+    core.set_cache(None)
+    core.set_rules(None)
+    core.set_breaker(None)
+
+    # Load lyrics cleaning rules and prepare PowerPoint templates before
+    # handling requests, so that bad configuration fails at startup
+    from . import fastpptx
+    core.get_rules()
+    core.get_base_pptx()
+    fastpptx.get_template()
+
+    # Cache generated PowerPoints on disk
+    from . import cache
+    app.extensions['deck_cache'] = cache.deck_cache_from_env()
+
+    # Optionally render PowerPoints in worker processes
+    from . import render
+    app.extensions['render_pool'] = render.from_env()
+
+    # Store background PowerPoint exports on disk
+    from . import jobs
+    app.extensions['export_jobs'] = jobs.from_env()
+
+    # Store songs between the last steps of the create form on disk
+    from . import drafts
+    app.extensions['drafts'] = drafts.from_env()
+
     from . import routes
     app.register_blueprint(routes.bp)
     app.register_error_handler(404, error_404)
+    app.register_error_handler(503, error_503)
 
     return app
@@ -0,0 +1,414 @@
+# Async counterparts to the lyrics lookups in core, used by the ASGI app
+# Lookups share the lyrics cache and cleaning rules of core, but wait on the API
+# without holding a thread.
+
+import asyncio
+from dataclasses import asdict
+import httpx
+import os
+
+from songs2slides import cache, core, ratelimit
+
+class AsyncLyricsClient:
+    """
+    Async client for the external lyrics API
+
+    Attributes
+    ----------
+    url : str
+        The API URL, with {title} and {artist} placeholders
+    retries : int
+        The number of retries after 5xx or 429 responses or connection errors
+    backoff_factor : float
+        The exponential backoff factor between retries
+    limiter : ratelimit.RateLimiter
+        The rate limiter for requests, or None
+    client : httpx.AsyncClient
+        The HTTP client used to query the API
+    """
+
+    def __init__(self, url: str, auth: str = None, pool_size: int = 10,
+                 connect_timeout: float = 5, read_timeout: float = 15,
+                 retries: int = 2, backoff_factor: float = 0.5,
+                 limiter: ratelimit.RateLimiter = None):
+        """
+        Parameters
+        ----------
+        url : str
+            The API URL, with {title} and {artist} placeholders
+        auth : str
+            The HTTP authorization header (default: None)
+        pool_size : int
+            The maximum number of open connections (default: 10)
+        connect_timeout : float
+            The connect timeout, in seconds (default: 5)
+        read_timeout : float
+            The read timeout, in seconds (default: 15)
+        retries : int
+            The number of retries after 5xx or 429 responses or connection
+            errors (default: 2)
+        backoff_factor : float
+            The exponential backoff factor between retries (default: 0.5)
+        limiter : ratelimit.RateLimiter
+            The rate limiter for requests, which also handles 429 responses
+            (default: None)
+        """
+
+        self.url = url
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.limiter = limiter
+
+        # Lookups beyond the pool size wait for a free connection
+        self.client = httpx.AsyncClient(
+            headers={ 'Authorization': auth } if auth else None,
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout,
+                                  pool=None),
+        )
+
+    @classmethod
+    def from_env(cls, provider: int = 1):
+        """
+        Create a client from the API_* environment variables
+
+        Parameters
+        ----------
+        provider : int
+            The number of the lyrics API, like core.LyricsClient.from_env
+            (default: 1)
+
+        Returns
+        -------
+        AsyncLyricsClient
+            The lyrics API client
+        """
+
+        # Get API URL
+        suffix = '' if provider == 1 else f'_{provider}'
+        url = os.getenv(f'API_URL{suffix}')
+        if url is None:
+            raise Exception(f'Bad API_URL{suffix}')
+
+        return cls(
+            url,
+            auth=os.getenv(f'API_AUTH{suffix}', None),
+            pool_size=int(os.getenv('API_POOL_SIZE', 10)),
+            connect_timeout=float(os.getenv('API_CONNECT_TIMEOUT', 5)),
+            read_timeout=float(os.getenv('API_READ_TIMEOUT', 15)),
+            retries=int(os.getenv('API_RETRIES', 2)),
+            limiter=ratelimit.from_env(provider),
+        )
+
+    async def get_song_data(self, title: str, artist: str):
+        """
+        Get song data from the API
+
+        Parameters
+        ----------
+        title : str
+            The title of the song
+        artist : str
+            The artist of the song
+
+        Returns
+        -------
+        core.SongData
+            The song data
+        """
+
+        # Get API URL
+        url = self.url.replace('{title}', title, 1)
+        url = url.replace('{artist}', artist, 1)
+
+        # Query API, retrying temporary failures with exponential backoff
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            # The rate limiter may be SQLite, so it's called on a worker thread
+            if self.limiter is not None:
+                await asyncio.sleep(
+                    await asyncio.to_thread(self.limiter.reserve))
+            try:
+                res = await self.client.get(url)
+            except httpx.TransportError:
+                if attempt == self.retries: raise
+                continue
+            if res.status_code == 429 and self.limiter is not None:
+                # Stop all requests sharing the rate limiter for a while
+                await asyncio.to_thread(
+                    self.limiter.block, ratelimit.parse_retry_after(
+                        res.headers.get('Retry-After')))
+            if res.status_code not in (429, 500, 502, 503, 504):
+                break
+
+        # The API is up but over its quota, which isn't a failure
+        if res.status_code == 429:
+            raise ratelimit.RateLimited()
+        return core.parse_response(res)
+
+    async def aclose(self):
+        """Close the HTTP client"""
+        await self.client.aclose()
+
+class AsyncHedgedLyricsClient:
+    """
+    Async client for several lyrics APIs, like core.HedgedLyricsClient
+
+    Lookups that are no longer needed once the song is found are cancelled.
+
+    Attributes
+    ----------
+    clients : list of AsyncLyricsClient
+        The clients for each API, in order
+    hedge_delay : float
+        The number of seconds to wait for an API before also trying the next
+    """
+
+    def __init__(self, clients: list[AsyncLyricsClient],
+                 hedge_delay: float = 1):
+        """
+        Parameters
+        ----------
+        clients : list of AsyncLyricsClient
+            The clients for each API, in order
+        hedge_delay : float
+            The number of seconds to wait for an API before also trying the
+            next (default: 1)
+        """
+
+        self.clients = clients
+        self.hedge_delay = hedge_delay
+
+    async def get_song_data(self, title: str, artist: str):
+        """
+        Get song data from the first API that finds it
+
+        Parameters
+        ----------
+        title : str
+            The title of the song
+        artist : str
+            The artist of the song
+
+        Returns
+        -------
+        core.SongData
+            The song data
+
+        Raises
+        ------
+        core.SongNotFound
+            If no API found the song
+        """
+
+        pending = set()
+        sent = 0
+        error = None
+
+        try:
+            while True:
+                # Send lookup to the next API
+                if sent < len(self.clients):
+                    pending.add(asyncio.ensure_future(
+                        self.clients[sent].get_song_data(title, artist)))
+                    sent += 1
+                if not pending:
+                    break
+
+                # Wait for an answer, or until it's time to try the next API
+                timeout = self.hedge_delay if sent < len(self.clients) \
+                    else None
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        return task.result()
+                    except core.SongNotFound:
+                        pass
+                    except Exception as e:
+                        error = e
+        finally:
+            # Stop lookups that are no longer needed
+            for task in pending:
+                task.cancel()
+
+        # Only report a song as not found if no API failed
+        raise error or core.SongNotFound()
+
+    async def aclose(self):
+        """Close the HTTP clients"""
+        for client in self.clients:
+            await client.aclose()
+
+def client_from_env():
+    """
+    Create an async lyrics API client from the API_* environment variables,
+    like core.client_from_env
+
+    Returns
+    -------
+    AsyncLyricsClient or AsyncHedgedLyricsClient
+        The lyrics API client
+    """
+
+    clients = [AsyncLyricsClient.from_env()]
+    while os.getenv(f'API_URL_{len(clients) + 1}'):
+        clients.append(AsyncLyricsClient.from_env(len(clients) + 1))
+    if len(clients) == 1:
+        return clients[0]
+    return AsyncHedgedLyricsClient(
+        clients, hedge_delay=float(os.getenv('API_HEDGE_DELAY', 1)))
+
+_client = None
+
+def get_client():
+    """
+    Get the async lyrics API client, creating it from the environment if needed
+
+    Returns
+    -------
+    AsyncLyricsClient or AsyncHedgedLyricsClient
+        The lyrics API client shared by this event loop
+    """
+
+    global _client
+    if _client is None:
+        _client = client_from_env()
+    return _client
+
+def set_client(client: AsyncLyricsClient | AsyncHedgedLyricsClient):
+    """
+    Set the async lyrics API client
+
+    Parameters
+    ----------
+    client : AsyncLyricsClient or AsyncHedgedLyricsClient
+        The lyrics API client, or None to recreate it from the environment
+    """
+
+    global _client
+    _client = client
+
+async def close_client():
+    """Close the async lyrics API client, if it was created"""
+
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+_in_flight = {}
+
+async def _query_song_data(key: str, title: str, artist: str):
+    # Query the API for song data and cache the result, like
+    # core._query_song_data
+    client = get_client()
+    circuit_breaker = core.get_breaker()
+    circuit_breaker.allow()
+    try:
+        value = asdict(await client.get_song_data(title, artist))
+    except circuit_breaker.skip:
+        circuit_breaker.record_skipped()
+        raise
+    except core.SongNotFound:
+        circuit_breaker.record_success()
+        value = None
+    except BaseException:
+        # Includes cancellation, so that a probe is never left unfinished
+        circuit_breaker.record_failure()
+        raise
+    else:
+        circuit_breaker.record_success()
+    await asyncio.to_thread(_cache_set, key, value)
+    return value
+
+def _cache_get(key: str):
+    # Read from the lyrics cache, which may be SQLite and so is called on a
+    # worker thread to avoid blocking the event loop
+    return core.get_cache().get(key)
+
+def _cache_set(key: str, value):
+    # Write to the lyrics cache, like _cache_get
+    core.get_cache().set(key, value)
+
+async def get_song_data(title: str, artist: str):
+    """
+    Get song data from an external API, using cached data when possible
+
+    Concurrent lookups of the same song share a single API request.
+
+    Parameters
+    ----------
+    title : str
+        The title of the song
+    artist : str
+        The artist of the song
+
+    Returns
+    -------
+    core.SongData
+        The song data
+    """
+
+    # Check cache
+    key = cache.make_key(title, artist)
+    value = await asyncio.to_thread(_cache_get, key)
+
+    if value is cache.MISS:
+        # Join an in-flight request for the same song, or start one
+        task = _in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_query_song_data(key, title, artist))
+            _in_flight[key] = task
+            task.add_done_callback(lambda _: _in_flight.pop(key, None))
+
+        # Keep the request going for other lookups if this one is cancelled
+        value = await asyncio.shield(task)
+
+    return core.song_from_cache(value)
+
+async def get_many_song_data(songs: list[tuple[str, str]],
+                             deadline: float = None):
+    """
+    Get song data for many songs concurrently
+
+    Lookups that are still running at the deadline are left to finish in the
+    background, so that their results are cached for later requests.
+
+    Parameters
+    ----------
+    songs : list of tuple of str
+        The (title, artist) pairs of the songs
+    deadline : float
+        The number of seconds to wait for lookups, after which the remaining
+        songs are returned as TimeoutErrors (default: None)
+
+    Returns
+    -------
+    list of core.SongData or Exception
+        The song data for each song, in the same order as the input, or the
+        exception that was raised while getting it
+    """
+
+    async def get(song):
+        try:
+            return await get_song_data(*song)
+        except Exception as e:
+            return e
+
+    if len(songs) == 0: return []
+    tasks = [asyncio.ensure_future(get(x)) for x in songs]
+    await asyncio.wait(tasks, timeout=deadline)
+
+    # Give up on songs that are taking too long
+    results = []
+    for task in tasks:
+        if task.done():
+            results.append(task.result())
+        else:
+            task.cancel()
+            results.append(TimeoutError('Lookup deadline exceeded'))
+    return results
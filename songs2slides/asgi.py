@@ -0,0 +1,104 @@
+# ASGI app for serving many step 2 requests per worker
+# Step 2 looks up lyrics with the async lyrics client so that requests waiting
+# on the API don't hold a thread. All other requests are handled by the Flask
+# app in a thread pool.
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+import songs2slides
+from songs2slides import aio, routes
+
+async def _read_body(receive):
+    # Read the whole request body
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+def _replay_body(body: bytes):
+    # Create an ASGI receive function that returns a body that was already read
+    messages = [{ 'type': 'http.request', 'body': body, 'more_body': False }]
+    async def receive():
+        return messages.pop() if messages else { 'type': 'http.disconnect' }
+    return receive
+
+def _build_environ(scope, body: bytes):
+    # Create a WSGI environment for an ASGI request
+    host = next((v.decode('latin-1') for k, v in scope['headers']
+                 if k == b'host'), 'localhost')
+    return EnvironBuilder(
+        path=scope['path'][len(scope.get('root_path', '')):],
+        base_url=f'{scope.get("scheme", "http")}://{host}'
+            f'{scope.get("root_path", "")}',
+        query_string=scope['query_string'].decode('latin-1'),
+        method=scope['method'],
+        headers=[(k.decode('latin-1'), v.decode('latin-1'))
+                 for k, v in scope['headers']],
+        data=body,
+    ).get_environ()
+
+def create_app():
+    """
+    Create the ASGI app
+
+    Returns
+    -------
+    callable
+        The ASGI app
+    """
+
+    flask_app = songs2slides.create_app()
+    wsgi_app = WsgiToAsgi(flask_app)
+    aio.set_client(None)
+
+    async def create_step_2(scope, body, send):
+        # Render step 2, or return False to let the Flask app handle it
+        with flask_app.request_context(_build_environ(scope, body)):
+            try:
+                songs = routes.parse_form(request.form)
+            except HTTPException:
+                return False
+            if 'stream' in request.form:
+                return False
+
+            results = await aio.get_many_song_data(
+                [(x.title, x.artist) for x in songs],
+                deadline=flask_app.config['LOOKUP_DEADLINE'])
+            response = flask_app.make_response(
+                routes.render_step_2(songs, results))
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                        for k, v in response.headers.items()],
+        })
+        await send({ 'type': 'http.response.body', 'body': response.data })
+        return True
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            # Close the lyrics API client on shutdown
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({ 'type': 'lifespan.startup.complete' })
+                elif message['type'] == 'lifespan.shutdown':
+                    await aio.close_client()
+                    await send({ 'type': 'lifespan.shutdown.complete' })
+                    return
+        elif scope['type'] == 'http' and scope['method'] == 'POST' and \
+                scope['path'][len(scope.get('root_path', '')):] == \
+                '/create/step-2/':
+            body = await _read_body(receive)
+            if not await create_step_2(scope, body, send):
+                await wsgi_app(scope, _replay_body(body), send)
+        else:
+            await wsgi_app(scope, receive, send)
+
+    return app
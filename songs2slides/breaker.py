@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+
+class CircuitOpen(Exception):
+    """Raised when a call is skipped because the service keeps failing"""
+    pass
+
+class CircuitBreaker:
+    """
+    Circuit breaker that stops calling a service after repeated failures
+
+    After failure_threshold failures in a row the circuit opens and calls fail
+    right away. Once reset_timeout seconds have passed, the circuit is half-open
+    and a single call is let through to probe the service, which closes the
+    circuit if it succeeds or opens it again if it fails.
+
+    Attributes
+    ----------
+    failure_threshold : int
+        The number of failures in a row that open the circuit
+    reset_timeout : float
+        The number of seconds to wait before probing the service
+    ignore : tuple of type
+        Exceptions that don't count as failures
+    skip : tuple of type
+        Exceptions raised before the call reached the service, which don't
+        count at all
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30,
+                 ignore: tuple[type, ...] = (), skip: tuple[type, ...] = ()):
+        """
+        Parameters
+        ----------
+        failure_threshold : int
+            The number of failures in a row that open the circuit (default: 5)
+        reset_timeout : float
+            The number of seconds to wait before probing the service (default:
+            30)
+        ignore : tuple of type
+            Exceptions that don't count as failures (default: ())
+        skip : tuple of type
+            Exceptions raised before the call reached the service, which don't
+            count at all (default: ())
+        """
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.ignore = ignore
+        self.skip = skip
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """The state of the circuit: 'closed', 'open', or 'half-open'"""
+        return self._state
+
+    def allow(self):
+        """
+        Check whether a call may be made
+
+        Callers must report the outcome with record_success, record_failure, or
+        record_skipped.
+
+        Raises
+        ------
+        CircuitOpen
+            If the circuit is open, or half-open and already being probed
+        """
+
+        with self._lock:
+            if self._state == 'closed':
+                return
+            if self._state == 'open' and \
+                    time.monotonic() >= self._opened_at + self.reset_timeout:
+                # Let this call probe the service
+                self._state = 'half-open'
+                return
+            self._rejected += 1
+            raise CircuitOpen()
+
+    def record_success(self):
+        """Report a successful call, closing the circuit"""
+
+        with self._lock:
+            self._state = 'closed'
+            self._failures = 0
+
+    def record_failure(self):
+        """Report a failed call, opening the circuit if needed"""
+
+        with self._lock:
+            self._failures += 1
+            if self._state == 'half-open' or \
+                    self._failures >= self.failure_threshold:
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+
+    def record_skipped(self):
+        """Report a call that didn't reach the service"""
+
+        with self._lock:
+            if self._state == 'half-open':
+                # Let the next call probe the service instead
+                self._state = 'open'
+
+    def call(self, function, *args):
+        """
+        Call a function through the circuit breaker
+
+        Parameters
+        ----------
+        function : callable
+            The function
+        *args
+            The arguments to the function
+
+        Returns
+        -------
+        object
+            The return value of the function
+
+        Raises
+        ------
+        CircuitOpen
+            If the call was skipped
+        """
+
+        self.allow()
+        try:
+            result = function(*args)
+        except self.skip:
+            self.record_skipped()
+            raise
+        except self.ignore:
+            self.record_success()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        """
+        Get circuit breaker statistics
+
+        Returns
+        -------
+        dict
+            The state, the number of failures in a row, and the number of
+            rejected calls
+        """
+
+        return { 'state': self._state, 'failures': self._failures,
+                 'rejected': self._rejected }
+
+def from_env(**kwargs):
+    """
+    Create a circuit breaker from the BREAKER_* environment variables
+
+    Parameters
+    ----------
+    **kwargs
+        Any other CircuitBreaker arguments
+
+    Returns
+    -------
+    CircuitBreaker
+        The circuit breaker
+    """
+
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv('BREAKER_THRESHOLD', 5)),
+        reset_timeout=float(os.getenv('BREAKER_RESET_TIMEOUT', 30)),
+        **kwargs,
+    )
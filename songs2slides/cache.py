@@ -0,0 +1,398 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Iterable
+
+# Returned by Cache.get when a key is not cached
+MISS = object()
+
+def make_key(title: str, artist: str):
+    """
+    Create a normalized cache key for a song
+
+    Parameters
+    ----------
+    title : str
+        The title of the song
+    artist : str
+        The artist of the song
+
+    Returns
+    -------
+    str
+        The cache key, ignoring case and extra whitespace
+    """
+
+    title = ' '.join(title.split()).casefold()
+    artist = ' '.join((artist or '').split()).casefold()
+    return f'{title}\x1f{artist}'
+
+class Cache(ABC):
+    """
+    Base class for lyrics caches
+
+    Cached values must be JSON-serializable. A value of None represents a song
+    that the API could not find.
+
+    Attributes
+    ----------
+    ttl : float
+        The number of seconds to keep found songs
+    not_found_ttl : float
+        The number of seconds to keep songs that were not found
+    hits : int
+        The number of cache hits
+    misses : int
+        The number of cache misses
+    """
+
+    def __init__(self, ttl: float = 86400, not_found_ttl: float = 3600):
+        self.ttl = ttl
+        self.not_found_ttl = not_found_ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Get a value from the cache
+
+        Parameters
+        ----------
+        key : str
+            The cache key
+
+        Returns
+        -------
+        object
+            The cached value, or MISS if the key is not cached or has expired
+        """
+
+        value = self._get(key, time.time())
+        with self._stats_lock:
+            if value is MISS:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        """
+        Add a value to the cache
+
+        Parameters
+        ----------
+        key : str
+            The cache key
+        value : object
+            The value to cache, or None if the song was not found
+        """
+
+        ttl = self.not_found_ttl if value is None else self.ttl
+        if ttl > 0:
+            self._set(key, value, time.time() + ttl)
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        Returns
+        -------
+        dict
+            The number of hits, misses, and cached entries
+        """
+
+        return { 'hits': self.hits, 'misses': self.misses, 'size': len(self) }
+
+    @abstractmethod
+    def _get(self, key: str, now: float):
+        pass
+
+    @abstractmethod
+    def _set(self, key: str, value, expires: float):
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+class MemoryCache(Cache):
+    """
+    In-process lyrics cache with LRU eviction
+
+    Attributes
+    ----------
+    max_size : int
+        The maximum number of cached entries
+    """
+
+    def __init__(self, max_size: int = 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISS
+            if entry[0] <= now:
+                # Remove expired entry
+                del self._entries[key]
+                return MISS
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _set(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+
+            # Evict least recently used entries
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SqliteCache(Cache):
+    """
+    On-disk lyrics cache that can be shared between processes
+
+    Uses SQLite in WAL mode so that all gunicorn workers can read and write the
+    same cache, which also survives restarts. When full, the entries closest to
+    expiring are evicted first.
+
+    Attributes
+    ----------
+    path : str
+        The path to the SQLite database
+    max_size : int
+        The maximum number of cached entries
+    table : str
+        The name of the table to store entries in
+    """
+
+    def __init__(self, path: str, max_size: int = 10000,
+                 table: str = 'lyrics', **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_size = max_size
+        self.table = table
+        self._local = threading.local()
+
+        # Create database and remove entries that expired while stopped
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        db = self._connection()
+        db.execute(f'CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY '
+                   'KEY, value TEXT NOT NULL, expires REAL NOT NULL)')
+        db.execute(f'CREATE INDEX IF NOT EXISTS {table}_expires '
+                   f'ON {table} (expires)')
+        db.execute(f'DELETE FROM {table} WHERE expires <= ?', (time.time(),))
+
+    def _connection(self):
+        # SQLite connections can't be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def _get(self, key, now):
+        row = self._connection().execute(
+            f'SELECT value, expires FROM {self.table} WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            return MISS
+        return json.loads(row[0])
+
+    def _set(self, key, value, expires):
+        db = self._connection()
+        db.execute(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)',
+                   (key, json.dumps(value), expires))
+
+        # Evict expired entries, then those closest to expiring
+        if len(self) > self.max_size:
+            db.execute(f'DELETE FROM {self.table} WHERE expires <= ?',
+                       (time.time(),))
+            db.execute(f'DELETE FROM {self.table} WHERE key IN (SELECT key '
+                       f'FROM {self.table} ORDER BY expires LIMIT ?)',
+                       (max(len(self) - self.max_size, 0),))
+
+    def __len__(self):
+        return self._connection().execute(
+            f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+# Version of the generated PowerPoint files, which is part of their cache keys
+# and ETags. Bump it whenever core.create_pptx or fastpptx output changes, so
+# that decks cached or downloaded before a deploy are not reused.
+DECK_VERSION = 1
+
+def make_deck_key(slides: Iterable[str], **options):
+    """
+    Create a content-addressed cache key for a slideshow
+
+    Parameters
+    ----------
+    slides : iterable of str
+        The slide contents, which are hashed one at a time
+    **options
+        Any other options that affect the generated file
+
+    Returns
+    -------
+    str
+        The SHA-256 hash of the file version, slides, and options
+    """
+
+    key = hashlib.sha256(f'{DECK_VERSION}\0'.encode('utf-8'))
+    key.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    for slide in slides:
+        key.update(b'\0' + json.dumps(slide).encode('utf-8'))
+    return key.hexdigest()
+
+class FileCache:
+    """
+    On-disk cache of generated files, shared between processes
+
+    Each entry is stored in its own file. When the total size exceeds the
+    limit, the least recently used files are removed first.
+
+    Attributes
+    ----------
+    directory : str
+        The directory to store files in
+    max_bytes : int
+        The maximum total size of all cached files
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str):
+        """
+        Get a file from the cache
+
+        Parameters
+        ----------
+        key : str
+            The cache key
+
+        Returns
+        -------
+        bytes
+            The file contents, or None if the key is not cached
+        """
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        # Mark file as recently used
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+        return data
+
+    def set(self, key: str, data: bytes):
+        """
+        Add a file to the cache
+
+        Parameters
+        ----------
+        key : str
+            The cache key
+        data : bytes
+            The file contents
+        """
+
+        if len(data) > self.max_bytes: return
+
+        # Write atomically so other processes never read partial files
+        fd, temp = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp, self._path(key))
+
+        self._evict()
+
+    def _evict(self):
+        # Get cached files, most recently used first
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.'): continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort(reverse=True)
+
+        # Remove least recently used files over the size limit
+        total = 0
+        for _, size, path in files:
+            total += size
+            if total > self.max_bytes:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+def from_env():
+    """
+    Create a lyrics cache from the CACHE_* environment variables
+
+    Returns
+    -------
+    Cache
+        The lyrics cache
+    """
+
+    kwargs = {
+        'ttl': float(os.getenv('CACHE_TTL', 86400)),
+        'not_found_ttl': float(os.getenv('CACHE_NOT_FOUND_TTL', 3600)),
+    }
+
+    # Use shared on-disk cache if a path is given
+    path = os.getenv('CACHE_PATH')
+    if path:
+        return SqliteCache(path, max_size=int(os.getenv('CACHE_SIZE', 10000)),
+                           **kwargs)
+    else:
+        return MemoryCache(max_size=int(os.getenv('CACHE_SIZE', 1024)),
+                           **kwargs)
+
+def deck_cache_from_env():
+    """
+    Create a slideshow cache from the DECK_CACHE_* environment variables
+
+    Returns
+    -------
+    FileCache
+        The slideshow cache, or None if disabled
+    """
+
+    path = os.getenv('DECK_CACHE_PATH',
+                     os.path.join(tempfile.gettempdir(), 'songs2slides-decks'))
+    max_bytes = int(os.getenv('DECK_CACHE_SIZE', 256 * 2**20))
+    if path == '' or max_bytes <= 0:
+        return None
+    return FileCache(path, max_bytes)
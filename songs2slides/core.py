@@ -1,4 +1,8 @@
-from dataclasses import dataclass
+from concurrent.futures import as_completed, FIRST_COMPLETED, Future, \
+    ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+import functools
+import io
 import pptx
 from pptx.dml.color import RGBColor
 from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
@@ -6,6 +10,13 @@ from pptx.util import Inches, Pt
 import os
 import re
 import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
+from typing import IO, Iterable
+from urllib3.util import Retry
+
+from songs2slides import breaker, cache, ratelimit, rules
 
 @dataclass
 class SongData:
@@ -30,6 +41,12 @@ class SongNotFound(Exception):
     """Raised when the API cannot find the lyrics to a song"""
     pass
 
+# Patterns used by filter_lyrics, compiled once
+_BRACKET_LINES = re.compile(r'\n\[[^\]]*\]\n')
+_PARENTHESIS_LINES = re.compile(r'\n\([^\)]*\)\n')
+_BRACKETS = re.compile(r'\[[^\]]*\]')
+_PARENTHESIS = re.compile(r'\([^\)]*\)')
+
 def filter_lyrics(lyrics: str):
     """
     Filter raw lyrics to remove text enclosed in brackets or parenthesis
@@ -49,26 +66,367 @@ def filter_lyrics(lyrics: str):
 
     filtered = '\n' + lyrics + '\n'
 
+    # Skip patterns that can't match
+    brackets = '[' in lyrics
+    parenthesis = '(' in lyrics
+
     # Remove enclosed text that takes up whole numbers of lines
-    filtered = re.sub(r'\n\[[^\]]*\]\n', '\n', filtered)
-    filtered = re.sub(r'\n\([^\)]*\)\n', '\n', filtered)
+    if brackets: filtered = _BRACKET_LINES.sub('\n', filtered)
+    if parenthesis: filtered = _PARENTHESIS_LINES.sub('\n', filtered)
 
     # Remove enclosed text that takes up partial lines
-    filtered = re.sub(r'\[[^\]]*\]', '', filtered)
-    filtered = re.sub(r'\([^\)]*\)', '', filtered)
+    if brackets: filtered = _BRACKETS.sub('', filtered)
+    if parenthesis: filtered = _PARENTHESIS.sub('', filtered)
 
     return filtered.strip()
 
-def get_song_data(title: str, artist:str):
+class LyricsClient:
+    """
+    Client for the external lyrics API
+
+    Keeps a pooled, keep-alive HTTP session so that connections are reused
+    across lookups
+
+    Attributes
+    ----------
+    url : str
+        The API URL, with {title} and {artist} placeholders
+    batch_url : str
+        The API URL for looking up many songs at once, or None
+    batch_size : int
+        The maximum number of songs per batch request
+    timeout : tuple of float
+        The connect and read timeouts, in seconds
+    retries : int
+        The number of retries after 5xx or 429 responses
+    limiter : ratelimit.RateLimiter
+        The rate limiter for requests, or None
+    session : requests.Session
+        The HTTP session used to query the API
+    """
+
+    def __init__(self, url: str, auth: str = None, pool_size: int = 10,
+                 connect_timeout: float = 5, read_timeout: float = 15,
+                 retries: int = 2, backoff_factor: float = 0.5,
+                 batch_url: str = None, batch_size: int = 50,
+                 limiter: ratelimit.RateLimiter = None):
+        """
+        Parameters
+        ----------
+        url : str
+            The API URL, with {title} and {artist} placeholders
+        auth : str
+            The HTTP authorization header (default: None)
+        pool_size : int
+            The maximum number of pooled connections (default: 10)
+        connect_timeout : float
+            The connect timeout, in seconds (default: 5)
+        read_timeout : float
+            The read timeout, in seconds (default: 15)
+        retries : int
+            The number of retries after 5xx or 429 responses (default: 2)
+        backoff_factor : float
+            The exponential backoff factor between retries (default: 0.5)
+        batch_url : str
+            The API URL for looking up many songs at once (default: None)
+        batch_size : int
+            The maximum number of songs per batch request (default: 50)
+        limiter : ratelimit.RateLimiter
+            The rate limiter for requests, which also handles 429 responses
+            (default: None)
+        """
+
+        self.url = url
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.limiter = limiter
+
+        # Retry temporary API failures with exponential backoff (batch lookups
+        # are POSTed but safe to repeat). Retry-After headers are ignored, since
+        # urllib3 would sleep for as long as they ask; 429 responses are handled
+        # by the rate limiter instead when there is one.
+        status_forcelist = [500, 502, 503, 504]
+        if limiter is None: status_forcelist.append(429)
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=status_forcelist,
+                      allowed_methods=['GET', 'POST'], raise_on_status=False,
+                      respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size, max_retries=retry)
+
+        # Create session
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if auth: self.session.headers['Authorization'] = auth
+
+    @classmethod
+    def from_env(cls, provider: int = 1):
+        """
+        Create a client from the API_* environment variables
+
+        Parameters
+        ----------
+        provider : int
+            The number of the lyrics API, whose API_URL, API_AUTH,
+            API_BATCH_URL, API_RATE, and API_RATE_BURST variables end with _2,
+            _3, etc. after the first (default: 1)
+
+        Returns
+        -------
+        LyricsClient
+            The lyrics API client
+        """
+
+        # Get API URL
+        suffix = '' if provider == 1 else f'_{provider}'
+        url = os.getenv(f'API_URL{suffix}')
+        if url is None:
+            raise Exception(f'Bad API_URL{suffix}')
+
+        return cls(
+            url,
+            auth=os.getenv(f'API_AUTH{suffix}', None),
+            pool_size=int(os.getenv('API_POOL_SIZE', 10)),
+            connect_timeout=float(os.getenv('API_CONNECT_TIMEOUT', 5)),
+            read_timeout=float(os.getenv('API_READ_TIMEOUT', 15)),
+            retries=int(os.getenv('API_RETRIES', 2)),
+            batch_url=os.getenv(f'API_BATCH_URL{suffix}') or None,
+            batch_size=int(os.getenv('API_BATCH_SIZE', 50)),
+            limiter=ratelimit.from_env(provider),
+        )
+
+    def _request(self, method: str, url: str, **kwargs):
+        """
+        Send a request to the API, waiting for the rate limiter
+
+        429 responses stop all requests sharing the rate limiter for as long as
+        the Retry-After header asks, then the request is retried.
+
+        Parameters
+        ----------
+        method : str
+            The name of the requests.Session method, like 'get' or 'post'
+        url : str
+            The URL
+        **kwargs
+            Any other arguments to the method
+
+        Returns
+        -------
+        requests.Response
+            The response
+
+        Raises
+        ------
+        ratelimit.RateLimited
+            If the request was shed by the rate limiter, or the API still
+            responded with 429 after all retries
+        """
+
+        send = getattr(self.session, method)
+        if self.limiter is None:
+            res = send(url, timeout=self.timeout, **kwargs)
+        else:
+            for attempt in range(self.retries + 1):
+                self.limiter.acquire()
+                res = send(url, timeout=self.timeout, **kwargs)
+                if res.status_code != 429:
+                    break
+                self.limiter.block(ratelimit.parse_retry_after(
+                    res.headers.get('Retry-After')))
+
+        # The API is up but over its quota, which isn't a failure
+        if res.status_code == 429:
+            raise ratelimit.RateLimited()
+        return res
+
+    def get_song_data(self, title: str, artist: str):
+        """
+        Get song data from the API
+
+        Parameters
+        ----------
+        title : str
+            The title of the song
+        artist : str
+            The artist of the song
+
+        Returns
+        -------
+        SongData
+            The song data
+        """
+
+        # Get API URL
+        url = self.url.replace('{title}', title, 1)
+        url = url.replace('{artist}', artist, 1)
+
+        # Query API
+        res = self._request('get', url)
+        return parse_response(res)
+
+    def get_many_song_data(self, songs: list[tuple[str, str]]):
+        """
+        Get song data for many songs from the batch API in one request
+
+        The batch API is sent a JSON list of {"title", "artist"} objects, and
+        responds with a list of song data objects (or null if a song was not
+        found) in the same order.
+
+        Parameters
+        ----------
+        songs : list of tuple of str
+            The (title, artist) pairs of the songs, at most batch_size
+
+        Returns
+        -------
+        list of SongData or SongNotFound
+            The song data for each song, or SongNotFound if it was not found
+        """
+
+        # Query API
+        res = self._request('post', self.batch_url, json=[
+            { 'title': title, 'artist': artist } for title, artist in songs
+        ])
+        res.raise_for_status()
+        data = res.json()
+
+        # Parse response
+        if not isinstance(data, list) or len(data) != len(songs):
+            raise Exception('API returned invalid batch data')
+        return [SongNotFound() if x is None else _parse_song_data(x)
+                for x in data]
+
+class HedgedLyricsClient:
+    """
+    Client for several lyrics APIs, which are tried in order
+
+    A lookup is sent to the first API, and also to the next one whenever the
+    APIs it was sent to haven't answered within the hedge delay. The first song
+    data found is returned. If an API can't find the song or fails, the lookup
+    falls through to the next API right away.
+
+    Attributes
+    ----------
+    clients : list of LyricsClient
+        The clients for each API, in order
+    hedge_delay : float
+        The number of seconds to wait for an API before also trying the next
+    """
+
+    def __init__(self, clients: list[LyricsClient], hedge_delay: float = 1,
+                 max_workers: int = 16):
+        """
+        Parameters
+        ----------
+        clients : list of LyricsClient
+            The clients for each API, in order
+        hedge_delay : float
+            The number of seconds to wait for an API before also trying the
+            next (default: 1)
+        max_workers : int
+            The maximum number of concurrent requests to each API (default: 16)
+        """
+
+        self.clients = clients
+        self.hedge_delay = hedge_delay
+
+        # Each API has its own threads, so that lookups waiting on a slow API
+        # don't hold up lookups sent to the next. Lookups queued for a busy API
+        # count towards the hedge delay, so they are also sent to the next.
+        self._executors = [ThreadPoolExecutor(max_workers) for _ in clients]
+
+    def get_song_data(self, title: str, artist: str):
+        """
+        Get song data from the first API that finds it
+
+        Parameters
+        ----------
+        title : str
+            The title of the song
+        artist : str
+            The artist of the song
+
+        Returns
+        -------
+        SongData
+            The song data
+
+        Raises
+        ------
+        SongNotFound
+            If no API found the song
+        """
+
+        pending = set()
+        sent = 0
+        error = None
+
+        try:
+            while True:
+                # Send lookup to the next API
+                if sent < len(self.clients):
+                    pending.add(self._executors[sent].submit(
+                        self.clients[sent].get_song_data, title, artist))
+                    sent += 1
+                if not pending:
+                    break
+
+                # Wait for an answer, or until it's time to try the next API
+                timeout = self.hedge_delay if sent < len(self.clients) \
+                    else None
+                done, pending = wait(pending, timeout,
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except SongNotFound:
+                        pass
+                    except Exception as e:
+                        error = e
+        finally:
+            # Don't send lookups that are no longer needed
+            for future in pending:
+                future.cancel()
+
+        # Only report a song as not found if no API failed
+        raise error or SongNotFound()
+
+def client_from_env():
     """
-    Get song data from an external API
+    Create a lyrics API client from the API_* environment variables
+
+    Additional APIs are configured like the first, with _2, _3, etc. at the end
+    of their API_URL, API_AUTH, API_RATE, and API_RATE_BURST variables, and are
+    tried after it in order. Batch lookups are not used with several APIs.
+
+    Returns
+    -------
+    LyricsClient or HedgedLyricsClient
+        The lyrics API client
+    """
+
+    clients = [LyricsClient.from_env()]
+    while os.getenv(f'API_URL_{len(clients) + 1}'):
+        clients.append(LyricsClient.from_env(len(clients) + 1))
+    if len(clients) == 1:
+        return clients[0]
+    return HedgedLyricsClient(
+        clients, hedge_delay=float(os.getenv('API_HEDGE_DELAY', 1)))
+
+def parse_response(res):
+    """
+    Parse song data from a lyrics API response
+
+    Used by LyricsClient and aio.AsyncLyricsClient
 
     Parameters
     ----------
-    title : str
-        The title of the song
-    artist : str
-        The artist of the song
+    res : requests.Response or httpx.Response
+        The API response
 
     Returns
     -------
@@ -76,38 +434,513 @@ def get_song_data(title: str, artist:str):
         The song data
     """
 
-    # Get API URL
-    url = os.getenv('API_URL')
-    if url is None:
-        raise Exception('Bad API_URL')
-    url = url.replace('{title}', title, 1)
-    url = url.replace('{artist}', artist, 1)
-
-    # Get HTTP authorization header
-    auth = os.getenv('API_AUTH', None)
-    headers = { 'Authorization': auth } if auth else {}
-
-    # Query API
-    res = requests.get(url, headers=headers)
-    if res.status_code != requests.codes.ok:
+    if res.status_code != 200:
         if res.status_code == 404:
             raise SongNotFound()
         else:
             res.raise_for_status()
-    data = res.json()
+    return _parse_song_data(res.json())
 
-    # Parse response
-    if 'lyrics' in data.keys():
+def _parse_song_data(data: dict):
+    # Parse song data returned by the API
+    if isinstance(data, dict) and 'lyrics' in data.keys():
         return SongData(data['title'], data['artist'],
                         filter_lyrics(data['lyrics']))
     else:
         raise Exception('API returned invalid lyric data')
 
-def parse_song_lyrics(lyrics: str, lines_per_slide: int):
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
     """
-    Parse slide contents from the raw lyrics of a song
+    Get the lyrics API client, creating it from the environment if needed
 
-    Used by assemble_slides
+    Returns
+    -------
+    LyricsClient or HedgedLyricsClient
+        The lyrics API client shared by this process
+    """
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = client_from_env()
+        return _client
+
+def set_client(client: LyricsClient | HedgedLyricsClient):
+    """
+    Set the lyrics API client shared by this process
+
+    Parameters
+    ----------
+    client : LyricsClient or HedgedLyricsClient
+        The lyrics API client, or None to recreate it from the environment
+    """
+
+    global _client
+    with _client_lock:
+        _client = client
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """
+    Get the lyrics cache, creating it from the environment if needed
+
+    Returns
+    -------
+    cache.Cache
+        The lyrics cache shared by this process
+    """
+
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = cache.from_env()
+        return _cache
+
+def set_cache(lyrics_cache: cache.Cache):
+    """
+    Set the lyrics cache shared by this process
+
+    Parameters
+    ----------
+    lyrics_cache : cache.Cache
+        The lyrics cache, or None to recreate it from the environment
+    """
+
+    global _cache
+    with _cache_lock:
+        _cache = lyrics_cache
+
+_rules = None
+_rules_lock = threading.Lock()
+
+def get_rules():
+    """
+    Get the lyrics cleaning rules, loading them from the environment if needed
+
+    Returns
+    -------
+    rules.RuleSet
+        The rule set shared by this process
+    """
+
+    global _rules
+    with _rules_lock:
+        if _rules is None:
+            _rules = rules.from_env()
+        return _rules
+
+def set_rules(rule_set: rules.RuleSet):
+    """
+    Set the lyrics cleaning rules shared by this process
+
+    Parameters
+    ----------
+    rule_set : rules.RuleSet
+        The rule set, or None to load it from the environment
+    """
+
+    global _rules
+    with _rules_lock:
+        _rules = rule_set
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+def get_breaker():
+    """
+    Get the lyrics API circuit breaker, creating it from the environment if
+    needed
+
+    Songs that are not found don't count as failures, and requests shed by the
+    rate limiter don't count at all.
+
+    Returns
+    -------
+    breaker.CircuitBreaker
+        The circuit breaker shared by this process
+    """
+
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = breaker.from_env(ignore=(SongNotFound,),
+                                        skip=(ratelimit.RateLimited,))
+        return _breaker
+
+def set_breaker(circuit_breaker: breaker.CircuitBreaker):
+    """
+    Set the lyrics API circuit breaker shared by this process
+
+    Parameters
+    ----------
+    circuit_breaker : breaker.CircuitBreaker
+        The circuit breaker, or None to create it from the environment
+    """
+
+    global _breaker
+    with _breaker_lock:
+        _breaker = circuit_breaker
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def _query_song_data(key: str, title: str, artist: str):
+    """
+    Query the API for song data and cache the result
+
+    Used by get_song_data
+
+    Parameters
+    ----------
+    key : str
+        The cache key of the song
+    title : str
+        The title of the song
+    artist : str
+        The artist of the song
+
+    Returns
+    -------
+    dict
+        The song data as cached, or None if the song was not found
+    """
+
+    lyrics_cache = get_cache()
+    try:
+        value = asdict(get_breaker().call(get_client().get_song_data, title,
+                                          artist))
+    except SongNotFound:
+        value = None
+    lyrics_cache.set(key, value)
+    return value
+
+def song_from_cache(value):
+    """
+    Create song data from a cached value, cleaning its lyrics
+
+    Used by get_song_data and aio.get_song_data
+
+    Parameters
+    ----------
+    value : dict
+        The song data as cached, or None if the song was not found
+
+    Returns
+    -------
+    SongData
+        A new copy of the song data
+    """
+
+    if value is None:
+        raise SongNotFound()
+    song = SongData(**value)
+    song.lyrics = get_rules().apply(song.lyrics)
+    return song
+
+def get_song_data(title: str, artist:str):
+    """
+    Get song data from an external API, using cached data when possible
+
+    Concurrent lookups of the same song share a single API request. Lyrics are
+    cleaned with the current rule set after they are read from the cache, so
+    changing the rules does not require clearing the cache.
+
+    Parameters
+    ----------
+    title : str
+        The title of the song
+    artist : str
+        The artist of the song
+
+    Returns
+    -------
+    SongData
+        The song data
+    """
+
+    # Check cache
+    key = cache.make_key(title, artist)
+    value = get_cache().get(key)
+
+    if value is cache.MISS:
+        # Join an in-flight request for the same song if there is one
+        with _in_flight_lock:
+            future = _in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = _in_flight[key] = Future()
+
+        # Otherwise query API and share the result with waiting lookups
+        if is_leader:
+            try:
+                future.set_result(_query_song_data(key, title, artist))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with _in_flight_lock:
+                    del _in_flight[key]
+
+        value = future.result()
+
+    return song_from_cache(value)
+
+def iter_many_song_data(songs: list[tuple[str, str]], max_workers: int = 8,
+                        deadline: float = None):
+    """
+    Get song data for many songs concurrently, as each lookup completes
+
+    Lookups that are already running at the deadline are left to finish in the
+    background, so that their results are cached for later requests.
+
+    Parameters
+    ----------
+    songs : list of tuple of str
+        The (title, artist) pairs of the songs
+    max_workers : int
+        The maximum number of concurrent API requests (default: 8)
+    deadline : float
+        The number of seconds to wait for lookups, after which the remaining
+        songs are returned as TimeoutErrors (default: None)
+
+    Yields
+    ------
+    int
+        The index of the song in the input
+    SongData or Exception
+        The song data, or the exception that was raised while getting it
+    """
+
+    def get(song):
+        try:
+            return get_song_data(*song)
+        except Exception as e:
+            return e
+
+    if len(songs) == 0: return
+
+    # Use a single request if the API supports batch lookups
+    client = _get_batch_client()
+    if client is not None and len(songs) > 1:
+        yield from _iter_batch_song_data(client, songs, deadline)
+        return
+
+    # Query API for all songs at once
+    executor = ThreadPoolExecutor(min(max_workers, len(songs)))
+    try:
+        futures = { executor.submit(get, x): i for i, x in enumerate(songs) }
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                yield futures.pop(future), future.result()
+        except TimeoutError:
+            # Give up on songs that are taking too long
+            for i in futures.values():
+                yield i, TimeoutError('Lookup deadline exceeded')
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _get_batch_client():
+    # Get the lyrics API client if it supports batch lookups
+    try:
+        client = get_client()
+    except Exception:
+        return None
+    return client if getattr(client, 'batch_url', None) else None
+
+def _get_result(value):
+    # Get song data from a cached value, or the exception it raises
+    try:
+        return song_from_cache(value)
+    except Exception as e:
+        return e
+
+def _iter_batch_song_data(client: LyricsClient, songs: list[tuple[str, str]],
+                          deadline: float = None):
+    """
+    Get song data for many songs with batch requests, as each request completes
+
+    Used by iter_many_song_data. Shares the cache and in-flight lookups with
+    get_song_data.
+
+    Parameters
+    ----------
+    client : LyricsClient
+        The lyrics API client, which has a batch URL
+    songs : list of tuple of str
+        The (title, artist) pairs of the songs
+    deadline : float
+        The number of seconds to wait for lookups, after which the remaining
+        songs are returned as TimeoutErrors (default: None)
+
+    Yields
+    ------
+    int
+        The index of the song in the input
+    SongData or Exception
+        The song data, or the exception that was raised while getting it
+    """
+
+    end = None if deadline is None else time.monotonic() + deadline
+    lyrics_cache = get_cache()
+    indexes = {}
+    for i, song in enumerate(songs):
+        indexes.setdefault(cache.make_key(*song), []).append(i)
+
+    # Find cached songs, and join in-flight lookups of other songs
+    cached = {}
+    joined = {}
+    leading = {}
+    for key, song_indexes in indexes.items():
+        value = lyrics_cache.get(key)
+        if value is not cache.MISS:
+            cached[key] = value
+            continue
+        with _in_flight_lock:
+            future = _in_flight.get(key)
+            if future is None:
+                leading[key] = _in_flight[key] = Future()
+            else:
+                joined[future] = key
+
+    def lookup(batch):
+        # Query the batch API and share the results with waiting lookups
+        try:
+            results = get_breaker().call(client.get_many_song_data,
+                [songs[indexes[x][0]] for x in batch])
+            for key, result in zip(batch, results):
+                value = None if isinstance(result, SongNotFound) \
+                    else asdict(result)
+                lyrics_cache.set(key, value)
+                leading[key].set_result(value)
+        except Exception as e:
+            for key in batch:
+                if not leading[key].done(): leading[key].set_exception(e)
+        finally:
+            with _in_flight_lock:
+                for key in batch:
+                    del _in_flight[key]
+
+    # Batch requests run on a worker thread, so that they can be given up on
+    # at the deadline while finishing in the background
+    executor = ThreadPoolExecutor(1)
+    sent = set()
+    try:
+        # Return cached songs right away
+        for key, value in cached.items():
+            for i in indexes[key]:
+                yield i, _get_result(value)
+
+        # Look up other songs in batches
+        keys = list(leading)
+        for start in range(0, len(keys), client.batch_size):
+            batch = keys[start:start + client.batch_size]
+            timeout = None if end is None else end - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                # Give up on songs that weren't looked up in time
+                timed_out = True
+            else:
+                sent.update(batch)
+                try:
+                    executor.submit(lookup, batch).result(timeout)
+                    timed_out = False
+                except TimeoutError:
+                    timed_out = True
+            for key in batch:
+                for i in indexes[key]:
+                    if timed_out:
+                        yield i, TimeoutError('Lookup deadline exceeded')
+                    else:
+                        yield i, leading[key].exception() or \
+                            _get_result(leading[key].result())
+
+        # Return songs from other lookups
+        timeout = None if end is None else max(end - time.monotonic(), 0)
+        try:
+            for future in as_completed(joined, timeout=timeout):
+                for i in indexes[joined.pop(future)]:
+                    yield i, future.exception() or _get_result(future.result())
+        except TimeoutError:
+            for key in joined.values():
+                for i in indexes[key]:
+                    yield i, TimeoutError('Lookup deadline exceeded')
+    finally:
+        executor.shutdown(wait=False)
+
+        # Don't leave other lookups waiting for songs that weren't sent
+        with _in_flight_lock:
+            for key, future in leading.items():
+                if key not in sent and not future.done():
+                    future.set_exception(Exception('Lookup cancelled'))
+                    del _in_flight[key]
+
+def get_many_song_data(songs: list[tuple[str, str]], max_workers: int = 8,
+                       deadline: float = None):
+    """
+    Get song data for many songs concurrently
+
+    Parameters
+    ----------
+    songs : list of tuple of str
+        The (title, artist) pairs of the songs
+    max_workers : int
+        The maximum number of concurrent API requests (default: 8)
+    deadline : float
+        The number of seconds to wait for lookups, after which the remaining
+        songs are returned as TimeoutErrors (default: None)
+
+    Returns
+    -------
+    list of SongData or Exception
+        The song data for each song, in the same order as the input, or the
+        exception that was raised while getting it
+    """
+
+    results = [None] * len(songs)
+    for i, result in iter_many_song_data(songs, max_workers, deadline):
+        results[i] = result
+    return results
+
+_prefetch_executor = ThreadPoolExecutor(4)
+_prefetch_slots = threading.BoundedSemaphore(64)
+
+def prefetch_song_data(title: str, artist: str):
+    """
+    Get song data in the background so that later lookups hit the cache
+
+    Parameters
+    ----------
+    title : str
+        The title of the song
+    artist : str
+        The artist of the song
+
+    Returns
+    -------
+    bool
+        Whether the prefetch was queued (False if too many are pending)
+    """
+
+    def prefetch():
+        try:
+            get_song_data(title, artist)
+        except Exception:
+            pass
+        finally:
+            _prefetch_slots.release()
+
+    # Shed prefetches instead of queueing them without limit
+    if not _prefetch_slots.acquire(blocking=False):
+        return False
+    _prefetch_executor.submit(prefetch)
+    return True
+
+def iter_song_slides(lyrics: str, lines_per_slide: int):
+    """
+    Parse slide contents from the raw lyrics of a song, one slide at a time
 
     Parameters
     ----------
@@ -116,40 +949,95 @@ def parse_song_lyrics(lyrics: str, lines_per_slide: int):
     lines_per_slide : int
         The maximum number of lines per slide
 
-    Returns
-    -------
-    list of str
-        The list of slide contents
+    Yields
+    ------
+    str
+        The slide contents
     """
 
-    slides = ['']
-    line_count = 0
+    # Address case where lyrics are empty
+    lyrics = lyrics.strip()
+    if lyrics == '': return
+
+    lines = [] # Lines on the current slide
+    previous_empty = False # Whether the previous slide was empty
 
-    for line in lyrics.strip().split('\n'):
+    for line in lyrics.split('\n'):
         line = line.strip()
 
         if line == '':
             # Empty line represents new slide
-            if line_count != 0 or len(slides) < 2 or slides[-2] != '':
+            if len(lines) != 0 or not previous_empty:
                 # Consecutive empty slides are not allowed
-                slides += ['']
-                line_count = 0
+                yield '\n'.join(lines)
+                previous_empty = len(lines) == 0
+                lines = []
 
-        elif lines_per_slide is None or line_count < lines_per_slide:
+        elif lines_per_slide is None or len(lines) < lines_per_slide:
             # Add line to current slide
-            if line_count != 0: slides[-1] += '\n'
-            slides[-1] += line
-            line_count += 1
+            lines.append(line)
 
         else:
             # Overflow to new slide
-            slides += [line]
-            line_count = 1
+            yield '\n'.join(lines)
+            previous_empty = len(lines) == 0
+            lines = [line]
 
-    # Address case where lyrics are empty
-    if slides == ['', '']: slides = []
+    yield '\n'.join(lines)
+
+def parse_song_lyrics(lyrics: str, lines_per_slide: int):
+    """
+    Parse slide contents from the raw lyrics of a song
+
+    Used by assemble_slides
+
+    Parameters
+    ----------
+    lyrics : str
+        The song lyrics
+    lines_per_slide : int
+        The maximum number of lines per slide
+
+    Returns
+    -------
+    list of str
+        The list of slide contents
+    """
+
+    return list(iter_song_slides(lyrics, lines_per_slide))
+
+def iter_slides(songs: Iterable[SongData], lines_per_slide: int = 4,
+                title_slides: bool = True, blank_slides: bool = True):
+    """
+    Assemble slides from songs, one song at a time
+
+    Only the current song is held in memory, so renderers can consume large
+    slideshows as they are assembled
+
+    Paramters
+    ---------
+    songs : iterable of SongData
+        The songs
+    lines_per_slide : int
+        The maximum number of lines per slide (default: 4)
+    title_slides : bool
+        Whether to include title slides before songs (default: True)
+    blank_slides : bool
+        Whether to include blank slides between songs (default: True)
+
+    Yields
+    ------
+    str
+        The content of each slide
+    """
 
-    return slides
+    for i, song in enumerate(songs):
+        # Add blank slide between songs
+        if blank_slides and i > 0: yield ''
+
+        # Add slides for song
+        if title_slides: yield f'{song.title.upper()}'
+        yield from iter_song_slides(song.lyrics.upper(), lines_per_slide)
 
 def assemble_slides(songs: list[SongData], lines_per_slide: int = 4,
                     title_slides: bool = True, blank_slides: bool = True):
@@ -173,28 +1061,21 @@ def assemble_slides(songs: list[SongData], lines_per_slide: int = 4,
         The list of slide contents
     """
 
-    slides = []
-    for song in songs:
-        # Add slides for song
-        if title_slides: slides += [f'{song.title.upper()}']
-        slides += parse_song_lyrics(song.lyrics.upper(), lines_per_slide)
-        if blank_slides: slides += ['']
-
-    # Remove trailing blank slides
-    if len(slides) and blank_slides: slides = slides[:-1]
-
-    return slides
+    return list(iter_slides(songs, lines_per_slide, title_slides,
+                            blank_slides))
 
-def create_pptx(slide_contents: list[str], filepath: str):
+@functools.cache
+def get_base_pptx():
     """
-    Create a PowerPoint from a list of slide contents
+    Get an empty 16:9 PowerPoint, creating it if needed
 
-    Parameters
-    ----------
-    slide_contents : list of str
-        The list of slide contents
-    filepath : str
-        The file to save the PowerPoint to
+    Used by create_pptx so that the default template is only loaded and
+    resized once per process
+
+    Returns
+    -------
+    bytes
+        The empty PowerPoint
     """
 
     # Create presentation
@@ -204,6 +1085,26 @@ def create_pptx(slide_contents: list[str], filepath: str):
     prs.slide_width = Inches(11)
     prs.slide_height = Inches(6.1875)
 
+    # Save to memory
+    f = io.BytesIO()
+    prs.save(f)
+    return f.getvalue()
+
+def create_pptx(slide_contents: Iterable[str], file: str | IO[bytes]):
+    """
+    Create a PowerPoint from slide contents
+
+    Parameters
+    ----------
+    slide_contents : iterable of str
+        The slide contents
+    file : str or binary file-like object
+        The path or writable stream to save the PowerPoint to
+    """
+
+    # Create presentation from a copy of the empty 16:9 PowerPoint
+    prs = pptx.Presentation(io.BytesIO(get_base_pptx()))
+
     # Get blank slide template
     blank_slide_layout = prs.slide_layouts[6]
 
@@ -233,4 +1134,4 @@ def create_pptx(slide_contents: list[str], filepath: str):
         paragraph.text = slide_content
 
     # Save to file
-    prs.save(filepath)
+    prs.save(file)
@@ -0,0 +1,87 @@
+from dataclasses import asdict
+import os
+import secrets
+import tempfile
+
+from songs2slides import cache, core
+
+class DraftStore:
+    """
+    On-disk store of songs that are being made into a slideshow
+
+    Lets the last step of the create form refer to its songs by a short id
+    instead of sending their lyrics back to the server. Drafts are shared
+    between processes, and are removed once they are older than the TTL or when
+    the store is full.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400, max_size: int = 10000):
+        """
+        Parameters
+        ----------
+        path : str
+            The path to the SQLite database
+        ttl : float
+            The number of seconds to keep drafts (default: 86400)
+        max_size : int
+            The maximum number of drafts (default: 10000)
+        """
+
+        self._cache = cache.SqliteCache(path, max_size=max_size,
+                                        table='drafts', ttl=ttl)
+
+    def create(self, songs: list[core.SongData]):
+        """
+        Store a draft
+
+        Parameters
+        ----------
+        songs : list of core.SongData
+            The songs
+
+        Returns
+        -------
+        str
+            The draft id
+        """
+
+        draft_id = secrets.token_urlsafe(12)
+        self._cache.set(draft_id, [asdict(x) for x in songs])
+        return draft_id
+
+    def get(self, draft_id: str):
+        """
+        Get the songs in a draft
+
+        Parameters
+        ----------
+        draft_id : str
+            The draft id
+
+        Returns
+        -------
+        list of core.SongData
+            The songs, or None if the draft doesn't exist or has expired
+        """
+
+        value = self._cache.get(draft_id)
+        if value is cache.MISS:
+            return None
+        return [core.SongData(**x) for x in value]
+
+def from_env():
+    """
+    Create a draft store from the DRAFT_* environment variables
+
+    Returns
+    -------
+    DraftStore
+        The draft store, or None if disabled
+    """
+
+    path = os.getenv('DRAFT_PATH', os.path.join(tempfile.gettempdir(),
+                                                'songs2slides-drafts.db'))
+    if path == '':
+        return None
+    return DraftStore(path, ttl=float(os.getenv('DRAFT_TTL', 86400)),
+                      max_size=int(os.getenv('DRAFT_SIZE', 10000)))
@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+
+# Valid job ids, which are also used as file names
+_JOB_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting to run"""
+    pass
+
+class JobStore:
+    """
+    On-disk store of background jobs, shared between processes
+
+    Jobs run in a thread of the process that submitted them, but their status
+    and results are stored as files so that any process can report them. Jobs
+    and their results are removed once they are older than the TTL.
+
+    Attributes
+    ----------
+    directory : str
+        The directory to store job status and results in
+    ttl : float
+        The number of seconds to keep jobs
+    max_queue : int
+        The maximum number of jobs running or waiting to run in this process
+    """
+
+    def __init__(self, directory: str, ttl: float = 3600,
+                 max_workers: int = 2, max_queue: int = None):
+        """
+        Parameters
+        ----------
+        directory : str
+            The directory to store job status and results in
+        ttl : float
+            The number of seconds to keep jobs (default: 3600)
+        max_workers : int
+            The maximum number of jobs to run at once (default: 2)
+        max_queue : int
+            The maximum number of jobs running or waiting to run in this
+            process (default: 4 per worker)
+        """
+
+        self.directory = directory
+        self.ttl = ttl
+        self.max_queue = max_workers * 4 if max_queue is None else max_queue
+        self._slots = threading.BoundedSemaphore(max(self.max_queue, 1))
+        if self.max_queue == 0: self._slots.acquire()
+        self._executor = ThreadPoolExecutor(max_workers)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str, state: str):
+        return os.path.join(self.directory, f'{job_id}.{state}')
+
+    def _write(self, job_id: str, state: str, data: bytes):
+        # Write atomically so other processes never read partial files
+        fd, temp = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp, self._path(job_id, state))
+
+    def _remove(self, job_id: str, state: str):
+        try:
+            os.remove(self._path(job_id, state))
+        except FileNotFoundError:
+            pass
+
+    def expire(self):
+        """Remove jobs that are older than the TTL"""
+
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Start a job in the background
+
+        Parameters
+        ----------
+        function : callable
+            The function to run, which must return bytes
+        *args
+            The arguments to the function
+        **kwargs
+            The keyword arguments to the function
+
+        Returns
+        -------
+        str
+            The job id
+
+        Raises
+        ------
+        JobQueueFull
+            If too many jobs are already waiting to run
+        """
+
+        self.expire()
+
+        # Refuse jobs instead of keeping their arguments in memory indefinitely
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull()
+
+        job_id = secrets.token_urlsafe(16)
+        try:
+            self._write(job_id, 'pending', b'')
+            self._executor.submit(self._run, job_id, function, args, kwargs)
+        except Exception:
+            self._remove(job_id, 'pending')
+            self._slots.release()
+            raise
+        return job_id
+
+    def _run(self, job_id: str, function, args, kwargs):
+        try:
+            self._write(job_id, 'done', function(*args, **kwargs))
+        except Exception as e:
+            self._write(job_id, 'failed', str(e).encode('utf-8'))
+        finally:
+            self._remove(job_id, 'pending')
+            self._slots.release()
+
+    def status(self, job_id: str):
+        """
+        Get the status of a job
+
+        Parameters
+        ----------
+        job_id : str
+            The job id
+
+        Returns
+        -------
+        str
+            'pending', 'done', or 'failed', or None if the job does not exist
+            or has expired
+        """
+
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        cutoff = time.time() - self.ttl
+        for state in ('done', 'failed', 'pending'):
+            try:
+                if os.stat(self._path(job_id, state)).st_mtime >= cutoff:
+                    return state
+            except FileNotFoundError:
+                pass
+        return None
+
+    def result(self, job_id: str):
+        """
+        Get the result of a finished job
+
+        Parameters
+        ----------
+        job_id : str
+            The job id
+
+        Returns
+        -------
+        bytes
+            The result, or None if the job is not done or has expired
+        """
+
+        if self.status(job_id) != 'done':
+            return None
+        try:
+            with open(self._path(job_id, 'done'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+def from_env():
+    """
+    Create a job store from the EXPORT_* environment variables
+
+    Returns
+    -------
+    JobStore
+        The job store
+    """
+
+    max_queue = os.getenv('EXPORT_QUEUE')
+    return JobStore(
+        os.getenv('EXPORT_PATH',
+                  os.path.join(tempfile.gettempdir(), 'songs2slides-exports')),
+        ttl=float(os.getenv('EXPORT_TTL', 3600)),
+        max_workers=int(os.getenv('EXPORT_WORKERS', 2)),
+        max_queue=None if max_queue is None else int(max_queue),
+    )
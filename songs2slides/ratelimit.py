@@ -0,0 +1,260 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+class RateLimited(Exception):
+    """
+    Raised when a request is shed because it would wait too long, or the API is
+    still rate limiting it after all retries
+    """
+    pass
+
+class RateLimiter(ABC):
+    """
+    Base class for token bucket rate limiters
+
+    The bucket holds up to burst tokens and is refilled at rate tokens per
+    second. Each request takes a token, waiting for one if the bucket is empty,
+    unless it would wait longer than max_wait, in which case it is shed.
+
+    Subclasses store the bucket, which is a number of tokens and the time it
+    was last updated. The number of tokens is negative while requests are
+    waiting.
+
+    Attributes
+    ----------
+    rate : float
+        The number of requests per second
+    burst : float
+        The maximum number of requests at once
+    max_wait : float
+        The maximum number of seconds a request waits before it is shed
+    """
+
+    def __init__(self, rate: float, burst: float = None, max_wait: float = 5):
+        """
+        Parameters
+        ----------
+        rate : float
+            The number of requests per second
+        burst : float
+            The maximum number of requests at once (default: the rate, or 1 if
+            the rate is lower)
+        max_wait : float
+            The maximum number of seconds a request waits before it is shed
+            (default: 5)
+        """
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.max_wait = max_wait
+
+    @abstractmethod
+    def _update(self, function):
+        # Atomically replace the bucket with function(tokens, updated), which
+        # returns the new tokens and updated time and a result to return
+        pass
+
+    def _refill(self, tokens, updated, now):
+        # Add the tokens that were refilled since the bucket was updated
+        if now > updated:
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            updated = now
+        return tokens, updated
+
+    def reserve(self):
+        """
+        Take a token for a request
+
+        Returns
+        -------
+        float
+            The number of seconds to wait before sending the request
+
+        Raises
+        ------
+        RateLimited
+            If the request would wait longer than max_wait
+        """
+
+        now = time.time()
+        def reserve(tokens, updated):
+            tokens, updated = self._refill(tokens, updated, now)
+            wait = updated - now + max(1 - tokens, 0) / self.rate
+            if wait > self.max_wait:
+                return tokens, updated, None
+            return tokens - 1, updated, max(wait, 0)
+
+        wait = self._update(reserve)
+        if wait is None:
+            raise RateLimited()
+        return wait
+
+    def acquire(self):
+        """
+        Wait until a request may be sent
+
+        Raises
+        ------
+        RateLimited
+            If the request would wait longer than max_wait
+        """
+
+        time.sleep(self.reserve())
+
+    def block(self, seconds: float):
+        """
+        Stop sending requests for a while, like when the API asks to with a
+        Retry-After header
+
+        Requests resume one at a time afterwards.
+
+        Parameters
+        ----------
+        seconds : float
+            The number of seconds to stop sending requests for
+        """
+
+        now = time.time()
+        def block(tokens, updated):
+            tokens, updated = self._refill(tokens, updated, now)
+            if now + seconds <= updated:
+                return tokens, updated, None
+            return min(tokens, 1), now + seconds, None
+
+        self._update(block)
+
+class MemoryRateLimiter(RateLimiter):
+    """Rate limiter for a single process"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._bucket = (self.burst, 0)
+        self._lock = threading.Lock()
+
+    def _update(self, function):
+        with self._lock:
+            tokens, updated, result = function(*self._bucket)
+            self._bucket = (tokens, updated)
+            return result
+
+class SqliteRateLimiter(RateLimiter):
+    """
+    Rate limiter that is shared between processes
+
+    Stores the bucket in SQLite so that all gunicorn workers share the same
+    request quota.
+
+    Attributes
+    ----------
+    path : str
+        The path to the SQLite database
+    name : str
+        The name of the bucket, so that a database can hold many
+    """
+
+    def __init__(self, path: str, *args, name: str = 'api', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+
+        # Create database
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._connection().execute('CREATE TABLE IF NOT EXISTS buckets (name '
+            'TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _connection(self):
+        # SQLite connections can't be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+        return db
+
+    def _update(self, function):
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT tokens, updated FROM buckets WHERE '
+                             'name = ?', (self.name,)).fetchone()
+            tokens, updated, result = function(*(row or (self.burst, 0)))
+            db.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)',
+                       (self.name, tokens, updated))
+        except:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return result
+
+def parse_retry_after(value: str, default: float = 1):
+    """
+    Parse a Retry-After header
+
+    Parameters
+    ----------
+    value : str
+        The header, which is a number of seconds or an HTTP date, or None
+    default : float
+        The number of seconds to use if the header is missing or not valid
+        (default: 1)
+
+    Returns
+    -------
+    float
+        The number of seconds to wait
+    """
+
+    if value is None:
+        return default
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+def from_env(provider: int = 1):
+    """
+    Create a lyrics API rate limiter from the API_RATE* environment variables
+
+    Parameters
+    ----------
+    provider : int
+        The number of the lyrics API, whose API_RATE and API_RATE_BURST
+        variables end with _2, _3, etc. after the first (default: 1)
+
+    Returns
+    -------
+    RateLimiter
+        The rate limiter, or None if API_RATE is not set
+    """
+
+    suffix = '' if provider == 1 else f'_{provider}'
+    rate = float(os.getenv(f'API_RATE{suffix}', 0))
+    if rate <= 0:
+        return None
+    burst = os.getenv(f'API_RATE_BURST{suffix}')
+    kwargs = {
+        'burst': float(burst) if burst else None,
+        'max_wait': float(os.getenv('API_RATE_MAX_WAIT', 5)),
+    }
+
+    # Share the quota between workers unless API_RATE_PATH is empty
+    path = os.getenv('API_RATE_PATH', os.path.join(tempfile.gettempdir(),
+                                                   'songs2slides-rate.db'))
+    if path == '':
+        return MemoryRateLimiter(rate, **kwargs)
+    return SqliteRateLimiter(path, rate, name=f'api{suffix}', **kwargs)
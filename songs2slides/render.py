@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import io
+import multiprocessing
+import os
+import threading
+from typing import Iterable
+
+from songs2slides import fastpptx
+
+class RenderQueueFull(Exception):
+    """Raised when too many PowerPoints are already waiting to be rendered"""
+    pass
+
+def render_pptx(slide_contents: Iterable[str]):
+    """
+    Render a PowerPoint in memory
+
+    Used by RenderPool in worker processes
+
+    Parameters
+    ----------
+    slide_contents : iterable of str
+        The slide contents
+
+    Returns
+    -------
+    bytes
+        The PowerPoint file
+    """
+
+    f = io.BytesIO()
+    fastpptx.create_pptx(slide_contents, f)
+    return f.getvalue()
+
+class RenderPool:
+    """
+    Pool of worker processes that render PowerPoints
+
+    Keeps CPU-bound rendering from blocking the web worker that received the
+    request
+
+    Attributes
+    ----------
+    max_queue : int
+        The maximum number of PowerPoints rendering or waiting to render
+    timeout : float
+        The number of seconds to wait for a PowerPoint to render
+    """
+
+    def __init__(self, workers: int, max_queue: int = None,
+                 timeout: float = 20):
+        """
+        Parameters
+        ----------
+        workers : int
+            The number of worker processes
+        max_queue : int
+            The maximum number of PowerPoints rendering or waiting to render
+            (default: 4 per worker)
+        timeout : float
+            The number of seconds to wait for a PowerPoint to render
+            (default: 20)
+        """
+
+        self.max_queue = workers * 4 if max_queue is None else max_queue
+        self.timeout = timeout
+        self._workers = workers
+        self._slots = threading.BoundedSemaphore(max(self.max_queue, 1))
+        if self.max_queue == 0: self._slots.acquire()
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self):
+        # Spawn workers rather than forking a threaded web worker
+        return ProcessPoolExecutor(
+            self._workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=fastpptx.get_template)
+
+    def _restart(self, executor):
+        # Replace a pool that broke when a worker died, unless another thread
+        # already has
+        with self._lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start()
+
+    def render_pptx(self, slide_contents: Iterable[str], wait: bool = False):
+        """
+        Render a PowerPoint in a worker process
+
+        Parameters
+        ----------
+        slide_contents : iterable of str
+            The slide contents, which are sent to the worker as a list
+        wait : bool
+            Whether to wait for a free slot and for the PowerPoint to render
+            however long it takes, as background jobs do (default: False)
+
+        Returns
+        -------
+        bytes
+            The PowerPoint file
+
+        Raises
+        ------
+        RenderQueueFull
+            If too many PowerPoints are already waiting to be rendered and
+            wait is False
+        TimeoutError
+            If the PowerPoint takes longer than the timeout to render and wait
+            is False
+        BrokenProcessPool
+            If a worker process died while rendering, in which case the workers
+            are restarted for later PowerPoints
+        """
+
+        # Refuse work instead of letting requests pile up
+        if not self._slots.acquire(blocking=wait):
+            raise RenderQueueFull()
+        try:
+            slide_contents = list(slide_contents)
+            executor = self._executor
+            try:
+                future = executor.submit(render_pptx, slide_contents)
+            except BrokenProcessPool:
+                # A worker died since the last render, so start new ones
+                self._restart(executor)
+                executor = self._executor
+                future = executor.submit(render_pptx, slide_contents)
+        except Exception:
+            self._slots.release()
+            raise
+
+        # Free slot once the worker is done, even if the request times out
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=None if wait else self.timeout)
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def from_env():
+    """
+    Create a render pool from the RENDER_* environment variables
+
+    Returns
+    -------
+    RenderPool
+        The render pool, or None if PowerPoints should be rendered in the web
+        worker
+    """
+
+    workers = int(os.getenv('RENDER_WORKERS', 0))
+    if workers <= 0:
+        return None
+
+    max_queue = os.getenv('RENDER_QUEUE')
+    return RenderPool(
+        workers,
+        max_queue=None if max_queue is None else int(max_queue),
+        timeout=float(os.getenv('RENDER_TIMEOUT', 20)),
+    )
@@ -1,8 +1,9 @@
-from flask import abort, Blueprint, redirect, render_template, request, \
-    send_file, url_for
-import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from flask import abort, Blueprint, current_app, jsonify, redirect, \
+    render_template, request, send_file, stream_template, url_for
+import io
 
-from songs2slides import core
+from songs2slides import cache, core, jobs, render
 
 bp = Blueprint('main', __name__)
 
@@ -36,6 +37,223 @@ def parse_form(form):
     else:
         return songs
 
+def apply_lookup(song, result):
+    """
+    Update a song with the result of a lyrics lookup
+
+    Parameters
+    ----------
+    song : core.SongData
+        The song from the form
+    result : core.SongData or Exception
+        The lookup result from core.get_many_song_data
+
+    Returns
+    -------
+    core.SongData
+        The song, with its lyrics split into stanzas if they were found
+    bool
+        Whether the API responded, even if the song was not found
+    """
+
+    if isinstance(result, core.SongData):
+        slides = core.parse_song_lyrics(result.lyrics, 4)
+        result.lyrics = '\n\n'.join(slides)
+        return result, True
+    else:
+        return song, isinstance(result, core.SongNotFound)
+
+def render_step_2(songs, results):
+    """
+    Render step 2 of the create form
+
+    Used by create_step_2 and the ASGI app
+
+    Parameters
+    ----------
+    songs : list of core.SongData
+        The songs from the form
+    results : list of core.SongData or Exception
+        The lookup result for each song
+
+    Returns
+    -------
+    str
+        The rendered page
+    """
+
+    api_error = True # Whether an API error occured for all requests
+    for i, result in enumerate(results):
+        songs[i], responded = apply_lookup(songs[i], result)
+        if responded: api_error = False
+
+    # Count missing songs
+    missing = sum([1 for x in songs if x.lyrics == None])
+
+    # Return song data
+    return render_template('create-step-2.html', songs=songs, missing=missing,
+                           api_error=api_error)
+
+def parse_slides_form(form):
+    """
+    Parse songs and slide options from a form
+
+    The songs are either in the form or in the draft it refers to
+
+    Parameters
+    ----------
+    form : flask.Request.form
+        The form data
+
+    Returns
+    -------
+    list of core.SongData
+        The songs
+    dict
+        The slide options, as accepted by core.iter_slides
+    """
+
+    if 'draft' in form:
+        drafts = current_app.extensions['drafts']
+        songs = drafts.get(form['draft']) if drafts else None
+        if songs is None: abort(404)
+    else:
+        songs = parse_form(form)
+    options = {
+        'lines_per_slide': None,
+        'title_slides': 'title-slides' in form,
+        'blank_slides': 'blank-slides' in form,
+    }
+    return songs, options
+
+def build_pptx(songs, options, deck_cache, render_pool, key=None,
+               wait=False):
+    """
+    Create a PowerPoint, using a cached copy when possible
+
+    Parameters
+    ----------
+    songs : list of core.SongData
+        The songs
+    options : dict
+        The slide options
+    deck_cache : cache.FileCache
+        The cache of generated PowerPoints, or None
+    render_pool : render.RenderPool
+        The pool to render PowerPoints in, or None to render them here
+    key : str
+        The cache key of the PowerPoint, or None to compute it (default: None)
+    wait : bool
+        Whether to wait for the render pool however long it takes, instead of
+        failing when it is overloaded (default: False)
+
+    Returns
+    -------
+    bytes
+        The PowerPoint file
+    """
+
+    # Slides are assembled as they are hashed and rendered, not stored
+    if key is None:
+        key = cache.make_deck_key(core.iter_slides(songs, **options),
+                                  **options)
+    data = deck_cache.get(key) if deck_cache else None
+    if data is None:
+        slides = core.iter_slides(songs, **options)
+        if render_pool:
+            data = render_pool.render_pptx(slides, wait=wait)
+        else:
+            data = render.render_pptx(slides)
+        if deck_cache: deck_cache.set(key, data)
+    return data
+
+def parse_slides_json(data):
+    """
+    Parse songs and slide options from a JSON request body
+
+    Parameters
+    ----------
+    data : object
+        The parsed JSON
+
+    Returns
+    -------
+    list of core.SongData
+        The songs, with lyrics set to None if they should be looked up
+    dict
+        The slide options, as accepted by core.iter_slides
+    str
+        The output type, either 'json' or 'pptx'
+    """
+
+    if not isinstance(data, dict) or not isinstance(data.get('songs'), list):
+        abort(400)
+
+    songs = []
+    for song in data['songs']:
+        if not isinstance(song, dict): abort(400)
+        title = song.get('title')
+        artist = song.get('artist') or ''
+        lyrics = song.get('lyrics')
+        if not isinstance(title, str) or not isinstance(artist, str) or \
+                (lyrics is not None and not isinstance(lyrics, str)):
+            abort(400)
+        songs += [core.SongData(title, artist, lyrics)]
+
+    options = {
+        'lines_per_slide': data.get('lines_per_slide', 4),
+        'title_slides': data.get('title_slides', True),
+        'blank_slides': data.get('blank_slides', True),
+    }
+    lines_per_slide = options['lines_per_slide']
+    if lines_per_slide is not None and (type(lines_per_slide) is not int or
+                                        lines_per_slide < 1):
+        abort(400)
+    if not isinstance(options['title_slides'], bool) or \
+            not isinstance(options['blank_slides'], bool):
+        abort(400)
+
+    output_type = data.get('output_type', 'json')
+    if output_type not in ('json', 'pptx'): abort(400)
+
+    return songs, options, output_type
+
+def send_pptx(songs, options):
+    """
+    Send a PowerPoint, or 304 Not Modified if the client already has it
+
+    Parameters
+    ----------
+    songs : list of core.SongData
+        The songs
+    options : dict
+        The slide options
+
+    Returns
+    -------
+    flask.Response
+        The response
+    """
+
+    # Skip generation if the client already has this powerpoint
+    key = cache.make_deck_key(core.iter_slides(songs, **options), **options)
+    if request.if_none_match.contains(key):
+        response = current_app.response_class(status=304)
+        response.set_etag(key)
+        return response
+
+    # Create powerpoint, unless the render pool is overloaded or restarting
+    try:
+        data = build_pptx(songs, options,
+                          current_app.extensions['deck_cache'],
+                          current_app.extensions['render_pool'], key)
+    except (render.RenderQueueFull, TimeoutError, BrokenProcessPool):
+        abort(503)
+
+    # Send powerpoint from memory
+    return send_file(io.BytesIO(data), as_attachment=True,
+                     download_name='slides.pptx', etag=key)
+
 @bp.route('/')
 def home():
     return render_template('home.html')
@@ -48,6 +266,60 @@ def create_root():
 def create_step_1():
     return render_template('create-step-1.html')
 
+@bp.post('/api/prefetch/')
+def prefetch():
+    # Parse song
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict): abort(400)
+    title = data.get('title')
+    artist = data.get('artist') or ''
+    if not isinstance(title, str) or not isinstance(artist, str) \
+            or title.strip() == '':
+        abort(400)
+
+    # Warm lyrics cache in the background
+    queued = core.prefetch_song_data(title, artist)
+    return jsonify(queued=queued), 202
+
+@bp.get('/api/metrics/')
+def metrics():
+    # Report lyrics cache and API circuit breaker state for this process
+    return jsonify(lyrics_cache=core.get_cache().stats(),
+                   circuit_breaker=core.get_breaker().stats())
+
+@bp.post('/api/slides/')
+def api_slides():
+    # Parse songs and options
+    songs, options, output_type = parse_slides_json(
+        request.get_json(silent=True))
+
+    # Get missing lyrics
+    indexes = [i for i, x in enumerate(songs) if x.lyrics is None]
+    results = core.get_many_song_data(
+        [(songs[i].title, songs[i].artist) for i in indexes],
+        deadline=current_app.config['LOOKUP_DEADLINE'])
+    missing = []
+    failed = []
+    for i, result in zip(indexes, results):
+        if isinstance(result, core.SongData):
+            songs[i] = result
+        elif isinstance(result, core.SongNotFound):
+            missing += [i]
+        else:
+            failed += [i]
+
+    # Report API errors separately, since the request may succeed if retried
+    if failed:
+        return jsonify(error='Lyrics API unavailable', failed=failed,
+                       missing=missing), 503, { 'Retry-After': '10' }
+    if missing:
+        return jsonify(error='Lyrics not found', missing=missing), 422
+
+    if output_type == 'pptx':
+        return send_pptx(songs, options)
+    else:
+        return jsonify(slides=list(core.iter_slides(songs, **options)))
+
 @bp.get('/create/step-2/')
 def create_step_2_get():
     # GET requests not allowed, redirect to step 1
@@ -58,25 +330,25 @@ def create_step_2():
     # Parse form data
     songs = parse_form(request.form)
 
-    # Get lyrics
-    api_error = True # Whether an API error occured for all requests
-    for i in range(len(songs)):
-        try:
-            songs[i] = core.get_song_data(songs[i].title, songs[i].artist)
-            api_error = False
-            slides = core.parse_song_lyrics(songs[i].lyrics, 4)
-            songs[i].lyrics = '\n\n'.join(slides)
-        except core.SongNotFound:
-            api_error = False
-        except Exception as e:
-            pass
+    queries = [(x.title, x.artist) for x in songs]
+    deadline = current_app.config['LOOKUP_DEADLINE']
 
-    # Count missing songs
-    missing = sum([1 for x in songs if x.lyrics == None])
+    if 'stream' in request.form:
+        # Render each song as soon as its lyrics are found
+        summary = { 'missing': 0, 'api_error': True }
+        def lookups():
+            for i, result in core.iter_many_song_data(queries,
+                                                      deadline=deadline):
+                songs[i], responded = apply_lookup(songs[i], result)
+                if responded: summary['api_error'] = False
+                if songs[i].lyrics == None: summary['missing'] += 1
+                yield i + 1, songs[i]
+        return stream_template('create-step-2.html', stream=lookups(),
+                               summary=summary)
 
-    # Return song data
-    return render_template('create-step-2.html', songs=songs, missing=missing,
-                           api_error=api_error)
+    # Get lyrics
+    return render_step_2(songs, core.get_many_song_data(queries,
+                                                        deadline=deadline))
 
 @bp.get('/create/step-3/')
 def create_step_3_get():
@@ -88,6 +360,12 @@ def create_step_3():
     # Parse form data
     songs = parse_form(request.form)
 
+    # Keep songs on the server so that only the draft id is sent back
+    drafts = current_app.extensions['drafts']
+    if drafts:
+        return render_template('create-step-3.html',
+                               draft=drafts.create(songs))
+
     # Return song data
     return render_template('create-step-3.html', songs=songs)
 
@@ -103,20 +381,47 @@ def slides_get():
 @bp.post('/slides/')
 def slides():
     # Parse form data
-    songs = parse_form(request.form)
-    title_slides = 'title-slides' in request.form
-    blank_slides = 'blank-slides' in request.form
-
-    # Assemble slides
-    slides = core.assemble_slides(songs, lines_per_slide = None,
-        title_slides=title_slides, blank_slides=blank_slides)
+    songs, options = parse_slides_form(request.form)
 
     if (request.form.get('output-type') == 'pptx'):
-        # Create and send powerpoint
-        with tempfile.NamedTemporaryFile(suffix='.pptx') as f:
-            core.create_pptx(slides, f.name)
-            return send_file(f.name, as_attachment=True,
-                             download_name='slides.pptx')
+        return send_pptx(songs, options)
+    else:
+        # Render HTML slides as they are assembled
+        return stream_template('slides.html',
+                               slides=core.iter_slides(songs, **options))
+
+@bp.post('/exports/')
+def create_export():
+    # Parse form data
+    songs, options = parse_slides_form(request.form)
+
+    # Create powerpoint in the background, unless too many are waiting
+    try:
+        job_id = current_app.extensions['export_jobs'].submit(
+            build_pptx, songs, options, current_app.extensions['deck_cache'],
+            current_app.extensions['render_pool'], wait=True)
+    except jobs.JobQueueFull:
+        abort(503)
+
+    status_url = url_for('.export_status', job_id=job_id)
+    return jsonify(id=job_id, status_url=status_url), 202, \
+        { 'Location': status_url }
+
+@bp.get('/exports/<job_id>/')
+def export_status(job_id):
+    status = current_app.extensions['export_jobs'].status(job_id)
+    if status is None: abort(404)
+
+    if status == 'done':
+        return jsonify(id=job_id, status=status, download_url=url_for(
+            '.export_download', job_id=job_id))
     else:
-        # Render HTML slides
-        return render_template('slides.html', slides=slides)
+        return jsonify(id=job_id, status=status)
+
+@bp.get('/exports/<job_id>/slides.pptx')
+def export_download(job_id):
+    data = current_app.extensions['export_jobs'].result(job_id)
+    if data is None: abort(404)
+
+    return send_file(io.BytesIO(data), as_attachment=True,
+                     download_name='slides.pptx')
@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+import functools
+import json
+import os
+import re
+from typing import Iterable
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    A lyrics cleaning rule that replaces all matches of a regular expression
+
+    Attributes
+    ----------
+    pattern : str
+        The regular expression to match
+    replacement : str
+        The replacement, which may refer to groups (default: '')
+    flags : str
+        Regular expression flags: i (ignore case), m (multiline), and s (dot
+        matches all) (default: '')
+    """
+
+    pattern: str
+    replacement: str = ''
+    flags: str = ''
+
+# Lines that may name a song section, like "Chorus:" or "Verse 2"
+_SECTION = r'(?:intro|verse|pre-chorus|chorus|refrain|bridge|tag|hook|' \
+    r'interlude|instrumental|outro|ending)(?:[ \t]*\d+)?'
+
+# Repeat markers, like "x2" or "2x"
+_REPEAT = r'\(?(?:[x×][ \t]?\d+|\d+[ \t]?[x×])\)?'
+
+# Built-in rules, by name
+BUILT_IN = {
+    'section-headers': (
+        # Remove headers on their own lines
+        Rule(rf'^[ \t]*{_SECTION}[ \t]*:?[ \t]*(?:\n|\Z)', flags='im'),
+        # Remove headers at the start of lines
+        Rule(rf'^[ \t]*{_SECTION}[ \t]*:[ \t]*', flags='im'),
+    ),
+    'repeat-markers': (
+        # Remove markers on their own lines
+        Rule(rf'^[ \t]*{_REPEAT}[ \t]*(?:\n|\Z)', flags='im'),
+        # Remove markers at the end of lines
+        Rule(rf'[ \t]+{_REPEAT}[ \t]*$', flags='im'),
+    ),
+    'credits': (
+        # Remove credit lines at the end of the lyrics
+        Rule(r'(?:^[ \t]*(?:(?:written|composed|lyrics|words|music|words and '
+             r'music) by\b|words:|music:|copyright\b|©|ccli\b)[^\n]*(?:\n|\Z)'
+             r'\s*)+\Z', flags='im'),
+    ),
+}
+
+class RuleSet:
+    """
+    An ordered set of compiled lyrics cleaning rules
+
+    Attributes
+    ----------
+    rules : tuple of Rule
+        The rules, in the order they are applied
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        """
+        Parameters
+        ----------
+        rules : iterable of Rule
+            The rules, in the order they are applied
+        """
+
+        self.rules = tuple(rules)
+        self._compiled = []
+        for rule in self.rules:
+            flags = 0
+            for flag in rule.flags:
+                flags |= { 'i': re.I, 'm': re.M, 's': re.S }[flag]
+            self._compiled.append((re.compile(rule.pattern, flags),
+                                   rule.replacement))
+
+    def apply(self, lyrics: str):
+        """
+        Clean lyrics by applying each rule in order
+
+        Parameters
+        ----------
+        lyrics : str
+            The lyrics
+
+        Returns
+        -------
+        str
+            The cleaned lyrics
+        """
+
+        if not self._compiled: return lyrics
+        for pattern, replacement in self._compiled:
+            lyrics = pattern.sub(replacement, lyrics)
+        return lyrics.strip()
+
+@functools.cache
+def get_rule_set(rules: tuple[Rule, ...]):
+    """
+    Get a compiled rule set, compiling it if needed
+
+    Parameters
+    ----------
+    rules : tuple of Rule
+        The rules, in the order they are applied
+
+    Returns
+    -------
+    RuleSet
+        The rule set shared by this process
+    """
+
+    return RuleSet(rules)
+
+def parse_rules(config: list):
+    """
+    Parse rules from a configuration
+
+    Parameters
+    ----------
+    config : list
+        The names of built-in rules, or dicts of Rule attributes
+
+    Returns
+    -------
+    tuple of Rule
+        The rules
+
+    Raises
+    ------
+    ValueError
+        If a rule is not valid
+    """
+
+    rules = []
+    for item in config:
+        if isinstance(item, str):
+            if item not in BUILT_IN:
+                raise ValueError(f'Unknown lyrics rule: {item}')
+            rules += BUILT_IN[item]
+        elif isinstance(item, dict):
+            try:
+                rule = Rule(**item)
+            except TypeError:
+                raise ValueError(f'Bad lyrics rule: {item}')
+            if not isinstance(rule.flags, str) or set(rule.flags) - set('ims'):
+                raise ValueError(f'Bad lyrics rule flags: {rule.flags}')
+            try:
+                # Compile now so bad patterns are reported with the config
+                re.compile(rule.pattern).sub(rule.replacement, '')
+            except (re.error, TypeError) as e:
+                raise ValueError(f'Bad lyrics rule: {item} ({e})')
+            rules.append(rule)
+        else:
+            raise ValueError(f'Bad lyrics rule: {item}')
+    return tuple(rules)
+
+def from_env():
+    """
+    Get a rule set from the LYRICS_RULES environment variable
+
+    LYRICS_RULES is a comma separated list of built-in rule names and paths to
+    JSON files containing lists of rules.
+
+    Returns
+    -------
+    RuleSet
+        The rule set, which is empty if LYRICS_RULES is not set
+    """
+
+    config = []
+    for item in os.getenv('LYRICS_RULES', '').split(','):
+        item = item.strip()
+        if item.endswith('.json'):
+            with open(item, encoding='utf-8') as f:
+                rules = json.load(f)
+            if not isinstance(rules, list):
+                raise ValueError(f'Bad lyrics rules file: {item}')
+            config += rules
+        elif item:
+            config.append(item)
+    return get_rule_set(parse_rules(config))
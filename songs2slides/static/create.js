@@ -23,6 +23,9 @@ addEventListener('pageshow', () => {
             raw_song.children[1].children[0].value = song.title
             raw_song.children[2].children[0].value = song.artist
         }
+        prefetch_songs(songs)
+        document.getElementById('songs').addEventListener('focusout',
+            schedule_prefetch)
     } else if (STEP === 2) {
         load_lyrics()
     } else if (STEP === 3) {
@@ -89,6 +92,41 @@ function save_songs() {
         })
     }
     storage_set('songs', songs)
+    schedule_prefetch()
+}
+
+// Songs whose lyrics have already been prefetched
+const prefetched = new Set()
+
+// Milliseconds to wait for typing to settle before prefetching
+const PREFETCH_DELAY = 1500
+let prefetch_timer = null
+
+function schedule_prefetch() {
+    // Prefetch once the songs stop changing, skipping the row being edited so
+    // that songs aren't looked up before their artist is entered
+    clearTimeout(prefetch_timer)
+    prefetch_timer = setTimeout(() => {
+        const editing = document.activeElement?.closest('tbody tr')
+        const rows = document.querySelectorAll('tbody tr')
+        const songs = storage_get('songs', [])
+        prefetch_songs(songs.filter((_, i) => rows[i] !== editing))
+    }, PREFETCH_DELAY)
+}
+
+function prefetch_songs(songs) {
+    // Start looking up lyrics before the form is submitted
+    // (PREFETCH_URL set in create-step-1.html template)
+    for (let song of songs) {
+        const key = get_song_key(song.title.trim(), song.artist.trim())
+        if (song.title.trim() === '' || prefetched.has(key)) continue
+        prefetched.add(key)
+        fetch(PREFETCH_URL, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ title: song.title, artist: song.artist }),
+        }).catch(() => prefetched.delete(key))
+    }
 }
 
 // Step 2 functions
@@ -108,16 +146,17 @@ function save_lyrics() {
 }
 
 function revert_lyrics(n) {
-    form[`lyrics-${n}`].value = DEFAULT_LYRICS[n-1]
-    if (DEFAULT_LYRICS[n-1] === '') {
-        document.getElementsByTagName('details')[n-1].classList.add('missing')
+    // Songs may be streamed out of order, so find them by id
+    const default_lyrics = form[`lyrics-${n}`].defaultValue
+    form[`lyrics-${n}`].value = default_lyrics
+    if (default_lyrics === '') {
+        document.getElementById(`song-${n}`).classList.add('missing')
         update_missing_message()
     }
     save_lyrics()
 }
 
 function load_lyrics() {
-    songs = document.getElementsByTagName('details')
     for (let i = 1; `title-${i}` in form; i++) {
         const title = form[`title-${i}`].value
         const artist = form[`artist-${i}`].value
@@ -125,8 +164,8 @@ function load_lyrics() {
         const saved_lyrics = storage_get(key, '')
         if (saved_lyrics !== '') {
             form[`lyrics-${i}`].value = saved_lyrics
-            songs[i - 1].classList.remove('missing')
-            songs[i - 1].open = false
+            document.getElementById(`song-${i}`).classList.remove('missing')
+            document.getElementById(`song-${i}`).open = false
         }
     }
     update_missing_message()
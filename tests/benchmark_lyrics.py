@@ -0,0 +1,45 @@
+# Run with: python -m tests.benchmark_lyrics [lyric files]
+# (not run by default due to lack of test_* filename prefix)
+
+import glob
+import os
+import re
+import sys
+import timeit
+
+from songs2slides import core
+
+def filter_lyrics_reference(lyrics):
+    # Previous implementation of core.filter_lyrics, compiling patterns through
+    # the re module cache and running every pass on every song
+    filtered = '\n' + lyrics + '\n'
+    filtered = re.sub(r'\n\[[^\]]*\]\n', '\n', filtered)
+    filtered = re.sub(r'\n\([^\)]*\)\n', '\n', filtered)
+    filtered = re.sub(r'\[[^\]]*\]', '', filtered)
+    filtered = re.sub(r'\([^\)]*\)', '', filtered)
+    return filtered.strip()
+
+def benchmark(filter_lyrics, corpus, repeat=5, number=200):
+    # Return the best number of songs filtered per second
+    best = min(timeit.repeat(lambda: [filter_lyrics(x) for x in corpus],
+                             repeat=repeat, number=number))
+    return len(corpus) * number / best
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or sorted(glob.glob(
+        os.path.join(os.path.dirname(__file__), 'lyrics', '*.txt')))
+    corpus = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            corpus.append(f.read())
+
+    # Check output is unchanged
+    for path, lyrics in zip(paths, corpus):
+        assert core.filter_lyrics(lyrics) == \
+            filter_lyrics_reference(lyrics), path
+
+    reference = benchmark(filter_lyrics_reference, corpus)
+    current = benchmark(core.filter_lyrics, corpus)
+    print(f'reference:     {reference:10.1f} songs/sec')
+    print(f'filter_lyrics: {current:10.1f} songs/sec '
+          f'({current / reference:.1f}x)')
@@ -0,0 +1,47 @@
+# Run with: python -m tests.benchmark_pptx [slide count]
+# (not run by default due to lack of test_* filename prefix)
+
+import io
+import sys
+import time
+import zipfile
+
+from songs2slides import core, fastpptx
+
+def benchmark(create_pptx, slides, repeat=3):
+    # Return the best number of slides created per second
+    best = float('inf')
+    for _ in range(repeat):
+        f = io.BytesIO()
+        start = time.perf_counter()
+        create_pptx(slides, f)
+        best = min(best, time.perf_counter() - start)
+
+    # Check output is a valid PowerPoint with every slide
+    f.seek(0)
+    assert zipfile.ZipFile(f).testzip() is None
+    f.seek(0)
+    assert len(core.pptx.Presentation(f).slides) == len(slides)
+
+    return len(slides) / best
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    slides = [f'LINE {i} OF A SONG\nLINE {i + 1} OF A SONG\n' \
+              f'LINE {i + 2} OF A SONG\nLINE {i + 3} OF A SONG'
+              for i in range(count)]
+
+    # Render fast builder template before timing
+    fastpptx.get_template()
+
+    python_pptx = benchmark(core.create_pptx, slides)
+    fast = benchmark(fastpptx.create_pptx, slides)
+    print(f'python-pptx: {python_pptx:10.1f} slides/sec')
+    print(f'fastpptx:    {fast:10.1f} slides/sec ({fast / python_pptx:.1f}x)')
+
+    # Repeat a chorus after every verse
+    chorus = 'CHORUS LINE ONE\nCHORUS LINE TWO\n' \
+        'CHORUS LINE THREE\nCHORUS LINE FOUR'
+    slides = [chorus if i % 2 else x for i, x in enumerate(slides)]
+    fast = benchmark(fastpptx.create_pptx, slides)
+    print(f'fastpptx (repeated chorus): {fast:10.1f} slides/sec')
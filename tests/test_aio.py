@@ -0,0 +1,277 @@
+import asyncio
+import httpx
+import pytest
+import threading
+
+from songs2slides import aio, breaker, cache, core, ratelimit, rules
+
+@pytest.fixture(autouse=True)
+def reset_aio():
+    # Use a fresh lyrics API client, cache, and circuit breaker, and no cleaning
+    # rules, for each test
+    aio.set_client(None)
+    core.set_cache(cache.MemoryCache())
+    core.set_rules(rules.RuleSet([]))
+    core.set_breaker(breaker.CircuitBreaker(ignore=(core.SongNotFound,)))
+    yield
+    aio.set_client(None)
+    core.set_cache(None)
+    core.set_rules(None)
+    core.set_breaker(None)
+
+def mock_client(handler, **kwargs):
+    # Create a client that sends requests to a handler instead of the network
+    client = aio.AsyncLyricsClient('api://lyrics/{artist}/{title}',
+                                   backoff_factor=0, **kwargs)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler),
+                                      headers=client.client.headers)
+    return client
+
+def test_async_lyrics_client_success():
+    # Mock API
+    requests = []
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={
+            'lyrics': 'raw[remove]',
+            'title': 'Foo',
+            'artist': 'Bar',
+        })
+    client = mock_client(handler, auth='Bearer secrettoken')
+
+    # Get song data
+    song_data = asyncio.run(client.get_song_data('foo', 'bar'))
+
+    # Assert request and song data are correct
+    assert str(requests[0].url) == 'api://lyrics/bar/foo'
+    assert requests[0].headers['Authorization'] == 'Bearer secrettoken'
+    assert song_data == core.SongData('Foo', 'Bar', 'raw')
+
+def test_async_lyrics_client_not_found():
+    # Mock API
+    client = mock_client(lambda _: httpx.Response(404))
+
+    # Assert SongNotFound is raised
+    with pytest.raises(core.SongNotFound):
+        asyncio.run(client.get_song_data('foo', 'bar'))
+
+def test_async_lyrics_client_retries():
+    # Mock API that fails twice
+    responses = [
+        httpx.Response(503),
+        httpx.Response(429),
+        httpx.Response(200, json={ 'lyrics': 'L', 'title': 'T',
+                                   'artist': 'A' }),
+    ]
+    client = mock_client(lambda _: responses.pop(0))
+
+    # Assert lookup succeeds after retries
+    song_data = asyncio.run(client.get_song_data('foo', 'bar'))
+    assert song_data == core.SongData('T', 'A', 'L')
+    assert responses == []
+
+def test_async_lyrics_client_rate_limited(mocker):
+    # Mock API that asks to retry later, and rate limiter
+    responses = [
+        httpx.Response(429, headers={ 'Retry-After': '2' }),
+        httpx.Response(200, json={ 'lyrics': 'L', 'title': 'T',
+                                   'artist': 'A' }),
+    ]
+    threads = []
+    limiter = mocker.Mock()
+    limiter.reserve.side_effect = \
+        lambda: threads.append(threading.current_thread()) or 0
+    limiter.block.side_effect = \
+        lambda _: threads.append(threading.current_thread())
+    client = mock_client(lambda _: responses.pop(0), limiter=limiter)
+
+    # Get song data
+    song_data = asyncio.run(client.get_song_data('foo', 'bar'))
+
+    # Assert requests waited for the limiter and paused after the 429, calling
+    # the limiter on worker threads
+    assert limiter.reserve.call_count == 2
+    limiter.block.assert_called_once_with(2)
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+    assert song_data == core.SongData('T', 'A', 'L')
+
+def test_async_lyrics_client_retries_exhausted():
+    # Mock API that always fails
+    client = mock_client(lambda _: httpx.Response(500), retries=1)
+
+    # Assert error is raised
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.get_song_data('foo', 'bar'))
+
+def test_async_lyrics_client_rate_limited_exhausted(mocker):
+    # Mock API that is always over its quota
+    client = mock_client(lambda _: httpx.Response(429), retries=1,
+                         limiter=mocker.Mock(**{ 'reserve.return_value': 0 }))
+
+    # Assert request is reported as rate limited rather than failed
+    with pytest.raises(ratelimit.RateLimited):
+        asyncio.run(client.get_song_data('foo', 'bar'))
+
+def test_get_song_data_coalesced(mocker):
+    # Mock lyrics API client
+    async def get_song_data(title, artist):
+        await asyncio.sleep(0.01)
+        return core.SongData('Foo', 'Bar', 'lyrics')
+    client = mocker.Mock()
+    client.get_song_data.side_effect = get_song_data
+    aio.set_client(client)
+
+    # Get song data for many songs, some of which are the same
+    results = asyncio.run(aio.get_many_song_data(
+        [('foo', 'bar'), ('FOO', 'bar'), ('baz', 'bar')]))
+
+    # Assert each distinct song was only queried once
+    assert client.get_song_data.call_count == 2
+    assert results == [core.SongData('Foo', 'Bar', 'lyrics')] * 3
+
+def test_get_song_data_shares_cache(mocker):
+    # Mock lyrics API client
+    client = mocker.Mock()
+    aio.set_client(client)
+    core.get_cache().set(cache.make_key('foo', 'bar'),
+                         { 'title': 'Foo', 'artist': 'Bar', 'lyrics': 'l x2' })
+    core.get_cache().set(cache.make_key('baz', 'bar'), None)
+    core.set_rules(rules.RuleSet(rules.BUILT_IN['repeat-markers']))
+
+    # Get song data
+    results = asyncio.run(aio.get_many_song_data(
+        [('foo', 'bar'), ('baz', 'bar')]))
+
+    # Assert cached results are cleaned and API was not queried
+    assert results[0] == core.SongData('Foo', 'Bar', 'l')
+    assert isinstance(results[1], core.SongNotFound)
+    client.get_song_data.assert_not_called()
+
+def test_get_song_data_cache_off_event_loop(mocker):
+    # Mock lyrics API client and cache that record the threads they run on
+    async def get_song_data(title, artist):
+        return core.SongData('Foo', 'Bar', 'lyrics')
+    client = mocker.Mock()
+    client.get_song_data.side_effect = get_song_data
+    aio.set_client(client)
+    lyrics_cache = core.get_cache()
+    threads = []
+    def record(method):
+        def wrapper(*args):
+            threads.append(threading.current_thread())
+            return method(*args)
+        return wrapper
+    mocker.patch.object(lyrics_cache, 'get', record(lyrics_cache.get))
+    mocker.patch.object(lyrics_cache, 'set', record(lyrics_cache.set))
+
+    # Get song data
+    asyncio.run(aio.get_many_song_data([('foo', 'bar')]))
+
+    # Assert the cache was read and written on worker threads
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+def test_get_song_data_errors_not_cached(mocker):
+    # Mock lyrics API client
+    client = mocker.Mock()
+    client.get_song_data.side_effect = Exception('API error')
+    aio.set_client(client)
+
+    # Get song data
+    results = asyncio.run(aio.get_many_song_data([('foo', 'bar')]))
+
+    # Assert error is returned and not cached
+    assert isinstance(results[0], Exception)
+    assert core.get_cache().get(cache.make_key('foo', 'bar')) is cache.MISS
+
+def test_get_song_data_circuit_open(mocker):
+    # Mock lyrics API client that always fails
+    client = mocker.Mock()
+    client.get_song_data.side_effect = Exception('API error')
+    aio.set_client(client)
+    core.set_breaker(breaker.CircuitBreaker(failure_threshold=1,
+                                            ignore=(core.SongNotFound,)))
+
+    # Get song data twice
+    first = asyncio.run(aio.get_many_song_data([('foo', 'bar')]))
+    second = asyncio.run(aio.get_many_song_data([('foo', 'bar')]))
+
+    # Assert API was not queried once the circuit opened
+    assert str(first[0]) == 'API error'
+    assert isinstance(second[0], breaker.CircuitOpen)
+    client.get_song_data.assert_called_once()
+
+def test_get_many_song_data_deadline(mocker):
+    # Mock lyrics API client with a slow first song
+    async def get_song_data(title, artist):
+        if title == 'slow': await asyncio.sleep(5)
+        return core.SongData(title, artist, 'lyrics')
+    client = mocker.Mock()
+    client.get_song_data.side_effect = get_song_data
+    aio.set_client(client)
+
+    # Get song data
+    results = asyncio.run(aio.get_many_song_data(
+        [('slow', 'bar'), ('fast', 'bar')], deadline=0.05))
+
+    # Assert slow song was given up on
+    assert isinstance(results[0], TimeoutError)
+    assert results[1] == core.SongData('fast', 'bar', 'lyrics')
+
+def test_hedged_client_hedges(mocker):
+    # Mock lyrics API clients with a slow primary API
+    cancelled = []
+    async def slow(title, artist):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+    async def fast(title, artist):
+        return core.SongData('T', 'A', 'secondary')
+    primary = mocker.Mock()
+    primary.get_song_data.side_effect = slow
+    secondary = mocker.Mock()
+    secondary.get_song_data.side_effect = fast
+    client = aio.AsyncHedgedLyricsClient([primary, secondary],
+                                         hedge_delay=0.01)
+
+    # Get song data
+    song_data = asyncio.run(client.get_song_data('foo', 'bar'))
+
+    # Assert the faster answer was returned and the slow lookup was cancelled
+    assert song_data == core.SongData('T', 'A', 'secondary')
+    assert cancelled == [True]
+
+def test_hedged_client_falls_through(mocker):
+    # Mock lyrics API clients with a primary API that can't find the song
+    async def not_found(title, artist):
+        raise core.SongNotFound()
+    async def found(title, artist):
+        return core.SongData('T', 'A', 'secondary')
+    primary = mocker.Mock()
+    primary.get_song_data.side_effect = not_found
+    secondary = mocker.Mock()
+    secondary.get_song_data.side_effect = found
+    client = aio.AsyncHedgedLyricsClient([primary, secondary], hedge_delay=5)
+
+    # Get song data
+    song_data = asyncio.run(asyncio.wait_for(
+        client.get_song_data('foo', 'bar'), 1))
+
+    # Assert the next API was queried without waiting for the hedge delay
+    assert song_data == core.SongData('T', 'A', 'secondary')
+
+def test_hedged_client_not_found(mocker):
+    # Mock lyrics API clients that can't find the song
+    async def not_found(title, artist):
+        raise core.SongNotFound()
+    providers = [mocker.Mock(), mocker.Mock()]
+    for provider in providers:
+        provider.get_song_data.side_effect = not_found
+    client = aio.AsyncHedgedLyricsClient(providers)
+
+    # Assert SongNotFound is raised
+    with pytest.raises(core.SongNotFound):
+        asyncio.run(client.get_song_data('foo', 'bar'))
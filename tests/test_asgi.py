@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from urllib.parse import urlencode
+
+from songs2slides import aio, asgi, core
+
+@pytest.fixture
+def app():
+    return asgi.create_app()
+
+def call(app, method, path, data=None):
+    # Send a request to the ASGI app and return the status and body
+    body = urlencode(data or {}).encode()
+    messages = [{ 'type': 'http.request', 'body': body, 'more_body': False }]
+    sent = []
+    async def receive():
+        return messages.pop() if messages else { 'type': 'http.disconnect' }
+    async def send(message):
+        sent.append(message)
+    asyncio.run(app({
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': b'',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'server': ('localhost', 80),
+    }, receive, send))
+    return sent[0]['status'], b''.join(x.get('body', b'') for x in sent[1:])
+
+def test_step_2_async(app, mocker):
+    # Mock async lookups
+    mocker.patch('songs2slides.aio.get_many_song_data',
+                 return_value=[core.SongData('T1', 'A1', 'L1'),
+                               core.SongNotFound()])
+    mocker.patch('songs2slides.core.get_many_song_data')
+
+    # Send request
+    status, body = call(app, 'POST', '/create/step-2/', {
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'title-2': 'T2',
+        'artist-2': 'A2',
+    })
+
+    # Assert lyrics were looked up asynchronously
+    aio.get_many_song_data.assert_called_with([('T1', 'A1'), ('T2', 'A2')],
+                                              deadline=25)
+    core.get_many_song_data.assert_not_called()
+    assert status == 200
+    assert b'>L1</textarea>' in body
+    assert b'<span id="missing-count">1</span>' in body
+
+def test_step_2_stream_uses_flask(app, mocker):
+    # Mock lookups
+    mocker.patch('songs2slides.aio.get_many_song_data')
+    mocker.patch('songs2slides.core.iter_many_song_data',
+                 return_value=[(0, core.SongData('T1', 'A1', 'L1'))])
+
+    # Send request
+    status, body = call(app, 'POST', '/create/step-2/', {
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'stream': 'on',
+    })
+
+    # Assert Flask app handled the request
+    aio.get_many_song_data.assert_not_called()
+    assert status == 200
+    assert b'>L1</textarea>' in body
+
+def test_step_2_bad_request(app, mocker):
+    # Mock async lookups
+    mocker.patch('songs2slides.aio.get_many_song_data')
+
+    # Send request without an artist
+    status, _ = call(app, 'POST', '/create/step-2/', { 'title-1': 'T1' })
+
+    # Assert response has 400 status code
+    assert status == 400
+    aio.get_many_song_data.assert_not_called()
+
+def test_other_routes_use_flask(app):
+    # Assert other requests are handled by the Flask app
+    assert call(app, 'GET', '/create/step-1/')[0] == 200
+    assert call(app, 'GET', '/unknown/')[0] == 404
+
+def test_lifespan(app, mocker):
+    # Mock close_client
+    mocker.patch('songs2slides.aio.close_client')
+
+    # Start and stop app
+    messages = [{ 'type': 'lifespan.startup' },
+                { 'type': 'lifespan.shutdown' }]
+    sent = []
+    async def receive():
+        return messages.pop(0)
+    async def send(message):
+        sent.append(message['type'])
+    asyncio.run(app({ 'type': 'lifespan' }, receive, send))
+
+    # Assert client was closed on shutdown
+    aio.close_client.assert_called_once()
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
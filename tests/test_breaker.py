@@ -0,0 +1,138 @@
+import pytest
+
+from songs2slides import breaker
+
+def fail():
+    raise Exception('error')
+
+def test_circuit_breaker_opens(mocker):
+    # Create circuit breaker
+    circuit_breaker = breaker.CircuitBreaker(failure_threshold=2)
+    function = mocker.Mock(side_effect=fail)
+
+    # Call failing function until the circuit opens
+    for _ in range(2):
+        with pytest.raises(Exception, match='error'):
+            circuit_breaker.call(function)
+    with pytest.raises(breaker.CircuitOpen):
+        circuit_breaker.call(function)
+
+    # Assert function was not called once the circuit opened
+    assert function.call_count == 2
+    assert circuit_breaker.stats() == { 'state': 'open', 'failures': 2,
+                                        'rejected': 1 }
+
+def test_circuit_breaker_success_resets_failures():
+    # Create circuit breaker
+    circuit_breaker = breaker.CircuitBreaker(failure_threshold=2)
+
+    # Alternate failures and successes
+    for _ in range(3):
+        with pytest.raises(Exception):
+            circuit_breaker.call(fail)
+        assert circuit_breaker.call(lambda x: x, 'result') == 'result'
+
+    # Assert circuit is still closed
+    assert circuit_breaker.state == 'closed'
+
+def test_circuit_breaker_ignored_exceptions():
+    # Create circuit breaker
+    circuit_breaker = breaker.CircuitBreaker(failure_threshold=1,
+                                             ignore=(KeyError,))
+
+    # Call function that raises an ignored exception
+    with pytest.raises(KeyError):
+        circuit_breaker.call({}.__getitem__, 'key')
+
+    # Assert circuit is still closed
+    assert circuit_breaker.state == 'closed'
+
+def test_circuit_breaker_half_open(mocker):
+    # Mock time.monotonic and open circuit
+    mocker.patch('songs2slides.breaker.time.monotonic', return_value=100)
+    circuit_breaker = breaker.CircuitBreaker(failure_threshold=1,
+                                             reset_timeout=30)
+    with pytest.raises(Exception):
+        circuit_breaker.call(fail)
+
+    # Assert circuit stays open until the reset timeout
+    breaker.time.monotonic.return_value = 129
+    with pytest.raises(breaker.CircuitOpen):
+        circuit_breaker.allow()
+
+    # Assert a single probe is allowed after the reset timeout
+    breaker.time.monotonic.return_value = 130
+    circuit_breaker.allow()
+    assert circuit_breaker.state == 'half-open'
+    with pytest.raises(breaker.CircuitOpen):
+        circuit_breaker.allow()
+
+    # Assert a successful probe closes the circuit
+    circuit_breaker.record_success()
+    assert circuit_breaker.state == 'closed'
+    circuit_breaker.allow()
+
+def test_circuit_breaker_failed_probe(mocker):
+    # Mock time.monotonic and open circuit
+    mocker.patch('songs2slides.breaker.time.monotonic', return_value=100)
+    circuit_breaker = breaker.CircuitBreaker(failure_threshold=3,
+                                             reset_timeout=30)
+    for _ in range(3):
+        with pytest.raises(Exception):
+            circuit_breaker.call(fail)
+
+    # Probe after the reset timeout
+    breaker.time.monotonic.return_value = 130
+    with pytest.raises(Exception, match='error'):
+        circuit_breaker.call(fail)
+
+    # Assert circuit opened again for another reset timeout
+    assert circuit_breaker.state == 'open'
+    breaker.time.monotonic.return_value = 159
+    with pytest.raises(breaker.CircuitOpen):
+        circuit_breaker.allow()
+
+def test_circuit_breaker_skipped_probe(mocker):
+    # Mock time.monotonic and open circuit
+    mocker.patch('songs2slides.breaker.time.monotonic', return_value=100)
+    circuit_breaker = breaker.CircuitBreaker(failure_threshold=1,
+                                             reset_timeout=30,
+                                             skip=(KeyError,))
+    with pytest.raises(Exception):
+        circuit_breaker.call(fail)
+
+    # Probe with a call that doesn't reach the service
+    breaker.time.monotonic.return_value = 130
+    with pytest.raises(KeyError):
+        circuit_breaker.call({}.__getitem__, 'key')
+
+    # Assert the next call probes the service instead
+    assert circuit_breaker.state == 'open'
+    circuit_breaker.allow()
+    assert circuit_breaker.state == 'half-open'
+
+def test_circuit_breaker_skipped_not_counted():
+    # Create circuit breaker
+    circuit_breaker = breaker.CircuitBreaker(failure_threshold=1,
+                                             skip=(KeyError,))
+
+    # Call function that raises a skipped exception
+    with pytest.raises(KeyError):
+        circuit_breaker.call({}.__getitem__, 'key')
+
+    # Assert circuit is still closed
+    assert circuit_breaker.stats() == { 'state': 'closed', 'failures': 0,
+                                        'rejected': 0 }
+
+def test_from_env(mocker):
+    # Mock environment
+    mocker.patch.dict('os.environ', { 'BREAKER_THRESHOLD': '3',
+                                      'BREAKER_RESET_TIMEOUT': '10' })
+
+    # Create circuit breaker
+    circuit_breaker = breaker.from_env(ignore=(KeyError,))
+
+    # Assert options were read
+    assert circuit_breaker.failure_threshold == 3
+    assert circuit_breaker.reset_timeout == 10
+    assert circuit_breaker.ignore == (KeyError,)
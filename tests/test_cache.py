@@ -0,0 +1,202 @@
+import os
+import pytest
+
+from songs2slides import cache
+
+def test_make_key_normalized():
+    # Assert keys ignore case and extra whitespace
+    assert cache.make_key(' Song  One ', 'ARTIST') == \
+        cache.make_key('song one', 'artist')
+    assert cache.make_key('Song', None) == cache.make_key('song', '')
+    assert cache.make_key('Song', 'A') != cache.make_key('Song', 'B')
+
+def test_cache_is_abstract():
+    # Assert the base class can't be used as a cache
+    with pytest.raises(TypeError):
+        cache.Cache()
+
+def test_memory_cache_get_set():
+    # Add values to cache
+    lyrics_cache = cache.MemoryCache()
+    lyrics_cache.set('a', { 'lyrics': 'A' })
+    lyrics_cache.set('b', None)
+
+    # Assert values are returned
+    assert lyrics_cache.get('a') == { 'lyrics': 'A' }
+    assert lyrics_cache.get('b') is None
+    assert lyrics_cache.get('c') is cache.MISS
+
+    # Assert stats are correct
+    assert lyrics_cache.stats() == { 'hits': 2, 'misses': 1, 'size': 2 }
+
+def test_memory_cache_lru_eviction():
+    # Fill cache
+    lyrics_cache = cache.MemoryCache(max_size=2)
+    lyrics_cache.set('a', 'A')
+    lyrics_cache.set('b', 'B')
+
+    # Use first entry then add another
+    lyrics_cache.get('a')
+    lyrics_cache.set('c', 'C')
+
+    # Assert least recently used entry was evicted
+    assert lyrics_cache.get('a') == 'A'
+    assert lyrics_cache.get('b') is cache.MISS
+    assert lyrics_cache.get('c') == 'C'
+    assert len(lyrics_cache) == 2
+
+def test_memory_cache_ttl(mocker):
+    # Mock time.time
+    mocker.patch('songs2slides.cache.time.time')
+    cache.time.time.return_value = 1000
+
+    # Add values to cache
+    lyrics_cache = cache.MemoryCache(ttl=60, not_found_ttl=10)
+    lyrics_cache.set('a', 'A')
+    lyrics_cache.set('b', None)
+
+    # Assert not found entries expire first
+    cache.time.time.return_value = 1030
+    assert lyrics_cache.get('a') == 'A'
+    assert lyrics_cache.get('b') is cache.MISS
+
+    # Assert found entries expire
+    cache.time.time.return_value = 1060
+    assert lyrics_cache.get('a') is cache.MISS
+    assert len(lyrics_cache) == 0
+
+def test_memory_cache_disabled():
+    # Add values to cache with caching disabled
+    lyrics_cache = cache.MemoryCache(ttl=0, not_found_ttl=0)
+    lyrics_cache.set('a', 'A')
+    lyrics_cache.set('b', None)
+
+    # Assert nothing was cached
+    assert lyrics_cache.get('a') is cache.MISS
+    assert lyrics_cache.get('b') is cache.MISS
+
+def test_sqlite_cache_get_set(tmp_path):
+    # Add values to cache
+    lyrics_cache = cache.SqliteCache(str(tmp_path / 'cache.db'))
+    lyrics_cache.set('a', { 'lyrics': 'A' })
+    lyrics_cache.set('b', None)
+
+    # Assert values are returned
+    assert lyrics_cache.get('a') == { 'lyrics': 'A' }
+    assert lyrics_cache.get('b') is None
+    assert lyrics_cache.get('c') is cache.MISS
+
+    # Assert stats are correct
+    assert lyrics_cache.stats() == { 'hits': 2, 'misses': 1, 'size': 2 }
+
+def test_sqlite_cache_shared(tmp_path):
+    # Add value to cache
+    path = str(tmp_path / 'cache' / 'cache.db')
+    cache.SqliteCache(path).set('a', 'A')
+
+    # Assert value is available to a new cache using the same file
+    assert cache.SqliteCache(path).get('a') == 'A'
+
+def test_sqlite_cache_ttl(tmp_path, mocker):
+    # Mock time.time
+    mocker.patch('songs2slides.cache.time.time')
+    cache.time.time.return_value = 1000
+
+    # Add values to cache
+    path = str(tmp_path / 'cache.db')
+    lyrics_cache = cache.SqliteCache(path, ttl=60, not_found_ttl=10)
+    lyrics_cache.set('a', 'A')
+    lyrics_cache.set('b', None)
+
+    # Assert not found entries expire first
+    cache.time.time.return_value = 1030
+    assert lyrics_cache.get('a') == 'A'
+    assert lyrics_cache.get('b') is cache.MISS
+
+    # Assert expired entries are removed on startup
+    cache.time.time.return_value = 1060
+    assert len(cache.SqliteCache(path)) == 0
+
+def test_sqlite_cache_max_size(tmp_path, mocker):
+    # Mock time.time
+    mocker.patch('songs2slides.cache.time.time')
+    cache.time.time.return_value = 1000
+
+    # Overfill cache
+    lyrics_cache = cache.SqliteCache(str(tmp_path / 'cache.db'), max_size=2)
+    lyrics_cache.set('a', 'A')
+    cache.time.time.return_value = 1001
+    lyrics_cache.set('b', 'B')
+    cache.time.time.return_value = 1002
+    lyrics_cache.set('c', 'C')
+
+    # Assert oldest entry was evicted
+    assert lyrics_cache.get('a') is cache.MISS
+    assert lyrics_cache.get('b') == 'B'
+    assert lyrics_cache.get('c') == 'C'
+
+def test_from_env(tmp_path, mocker):
+    # Mock os.getenv
+    mocker.patch('songs2slides.cache.os.getenv')
+    env = { 'CACHE_TTL': '60' }
+    cache.os.getenv.side_effect = lambda key, default=None: \
+        env.get(key, default)
+
+    # Assert in-memory cache is used by default
+    lyrics_cache = cache.from_env()
+    assert isinstance(lyrics_cache, cache.MemoryCache)
+    assert lyrics_cache.ttl == 60
+
+    # Assert on-disk cache is used when a path is given
+    env['CACHE_PATH'] = str(tmp_path / 'cache.db')
+    lyrics_cache = cache.from_env()
+    assert isinstance(lyrics_cache, cache.SqliteCache)
+    assert lyrics_cache.max_size == 10000
+
+def test_make_deck_key():
+    # Assert keys depend on slides and options
+    key = cache.make_deck_key(['A', 'B'], title_slides=True)
+    assert key == cache.make_deck_key(['A', 'B'], title_slides=True)
+    assert key != cache.make_deck_key(['A', 'C'], title_slides=True)
+    assert key != cache.make_deck_key(['A', 'B'], title_slides=False)
+    assert key != cache.make_deck_key(['A\nB'], title_slides=True)
+
+def test_make_deck_key_version(mocker):
+    # Create key
+    key = cache.make_deck_key(['A', 'B'], title_slides=True)
+
+    # Assert key changes with the file version
+    mocker.patch('songs2slides.cache.DECK_VERSION', cache.DECK_VERSION + 1)
+    assert key != cache.make_deck_key(['A', 'B'], title_slides=True)
+
+def test_file_cache_get_set(tmp_path):
+    # Add file to cache
+    deck_cache = cache.FileCache(str(tmp_path / 'decks'))
+    deck_cache.set('a', b'A')
+
+    # Assert file is returned
+    assert deck_cache.get('a') == b'A'
+    assert deck_cache.get('b') is None
+
+    # Assert file is shared with other caches in the same directory
+    assert cache.FileCache(str(tmp_path / 'decks')).get('a') == b'A'
+
+def test_file_cache_max_bytes(tmp_path):
+    # Fill cache
+    deck_cache = cache.FileCache(str(tmp_path), max_bytes=4)
+    deck_cache.set('a', b'AA')
+    deck_cache.set('b', b'BB')
+    os.utime(tmp_path / 'a', (1000, 1000))
+    os.utime(tmp_path / 'b', (2000, 2000))
+
+    # Add another file
+    deck_cache.set('c', b'CC')
+
+    # Assert least recently used file was removed
+    assert deck_cache.get('a') is None
+    assert deck_cache.get('b') == b'BB'
+    assert deck_cache.get('c') == b'CC'
+
+    # Assert files larger than the cache are not stored
+    deck_cache.set('d', b'DDDDD')
+    assert deck_cache.get('d') is None
@@ -1,6 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from hypothesis import given, strategies as st
+import io
 import pytest
-
-from songs2slides import core
+import re
+import threading
+import time
+
+from songs2slides import breaker, cache, core, ratelimit, rules
+
+@pytest.fixture(autouse=True)
+def reset_core():
+    # Use a fresh lyrics API client, cache, and circuit breaker, and no cleaning
+    # rules, for each test
+    core.set_client(None)
+    core.set_cache(cache.MemoryCache())
+    core.set_rules(rules.RuleSet([]))
+    core.set_breaker(breaker.CircuitBreaker(ignore=(core.SongNotFound,)))
+    yield
+    core.set_client(None)
+    core.set_cache(None)
+    core.set_rules(None)
+    core.set_breaker(None)
 
 def test_filter_lyrics_inline():
     # Declare raw lyrics and expected cleaned lyrics
@@ -57,6 +78,17 @@ def test_filter_lyrics_all():
     # Assert slides are correct
     assert result == expected
 
+def test_filter_lyrics_nothing_enclosed():
+    # Declare raw lyrics and expected cleaned lyrics
+    lyrics = '\nA\nB]\n\nC)D\n'
+    expected = 'A\nB]\n\nC)D'
+
+    # Clean lyrics
+    result = core.filter_lyrics(lyrics)
+
+    # Assert slides are correct
+    assert result == expected
+
 def test_filter_lyrics_empty_string():
     # Clean lyrics
     result = core.filter_lyrics('')
@@ -64,34 +96,43 @@ def test_filter_lyrics_empty_string():
     # Assert slides are correct
     assert result == ''
 
-def test_get_song_data_success(mocker):
-    # Mock os.getenv, requests.get, and filter_lyrics
-    mocker.patch('songs2slides.core.os.getenv')
-    mocker.patch('songs2slides.core.requests.get')
+def filter_lyrics_reference(lyrics):
+    # Original implementation of filter_lyrics
+    filtered = '\n' + lyrics + '\n'
+    filtered = re.sub(r'\n\[[^\]]*\]\n', '\n', filtered)
+    filtered = re.sub(r'\n\([^\)]*\)\n', '\n', filtered)
+    filtered = re.sub(r'\[[^\]]*\]', '', filtered)
+    filtered = re.sub(r'\([^\)]*\)', '', filtered)
+    return filtered.strip()
+
+@given(lyrics=st.text(alphabet='A []()\n'))
+def test_filter_lyrics_matches_reference(lyrics):
+    # Assert filtered lyrics match the original implementation
+    assert core.filter_lyrics(lyrics) == filter_lyrics_reference(lyrics)
+
+def test_lyrics_client_success(mocker):
+    # Mock requests.Session and filter_lyrics
+    mocker.patch('songs2slides.core.requests.Session')
     mocker.patch('songs2slides.core.filter_lyrics')
-    core.os.getenv.side_effect = [
-        'api://lyrics/{artist}/{title}',
-        'Bearer secrettoken'
-    ]
-    core.requests.get.return_value.json.return_value = {
+    session = core.requests.Session.return_value
+    session.headers = {}
+    session.get.return_value.json.return_value = {
         'lyrics': 'raw',
         'title': 'Foo',
         'artist': 'Bar',
     }
-    core.requests.get.return_value.status_code = 200
+    session.get.return_value.status_code = 200
     core.filter_lyrics.return_value = 'clean'
 
     # Get song data
-    song_data = core.get_song_data('foo', 'bar')
+    client = core.LyricsClient('api://lyrics/{artist}/{title}',
+                               auth='Bearer secrettoken', connect_timeout=1,
+                               read_timeout=2)
+    song_data = client.get_song_data('foo', 'bar')
 
     # Assert mocked methods were used correctly
-    core.os.getenv.assert_has_calls([
-        mocker.call('API_URL'),
-        mocker.call('API_AUTH', None)
-    ])
-    core.requests.get.assert_called_with('api://lyrics/bar/foo', headers={
-        'Authorization': 'Bearer secrettoken'
-    })
+    assert session.headers == { 'Authorization': 'Bearer secrettoken' }
+    session.get.assert_called_with('api://lyrics/bar/foo', timeout=(1, 2))
     core.filter_lyrics.assert_called_with('raw')
 
     # Assert song data is correct
@@ -99,73 +140,761 @@ def test_get_song_data_success(mocker):
     assert song_data.artist == 'Bar'
     assert song_data.lyrics == 'clean'
 
-def test_get_song_data_no_auth_header(mocker):
-    # Mock os.getenv, requests.get, and filter_lyrics
-    mocker.patch('songs2slides.core.os.getenv')
-    mocker.patch('songs2slides.core.requests.get')
-    mocker.patch('songs2slides.core.filter_lyrics')
-    core.os.getenv.side_effect = [
-        'api://lyrics/{artist}/{title}',
-        None,
-    ]
-    core.requests.get.return_value.json.return_value = {
+def test_lyrics_client_no_auth_header(mocker):
+    # Mock requests.Session
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    session.headers = {}
+
+    # Create client
+    core.LyricsClient('api://lyrics/{artist}/{title}')
+
+    # Assert no authorization header was set
+    assert session.headers == {}
+
+def test_lyrics_client_ignores_retry_after():
+    # Create client
+    client = core.LyricsClient('http://lyrics/{artist}/{title}', retries=3,
+                               backoff_factor=0.1)
+
+    # Assert retries back off without sleeping for as long as the API asks
+    retry = client.session.get_adapter('http://lyrics/').max_retries
+    assert retry.total == 3
+    assert retry.backoff_factor == 0.1
+    assert retry.respect_retry_after_header is False
+
+def test_lyrics_client_reuses_session(mocker):
+    # Mock requests.Session
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    session.get.return_value.json.return_value = {
         'lyrics': 'raw',
         'title': 'Foo',
         'artist': 'Bar',
     }
-    core.requests.get.return_value.status_code = 200
-    core.filter_lyrics.return_value = 'clean'
+    session.get.return_value.status_code = 200
+
+    # Get song data twice
+    client = core.LyricsClient('api://lyrics/{artist}/{title}')
+    client.get_song_data('foo', 'bar')
+    client.get_song_data('baz', 'qux')
+
+    # Assert the same session was used for both requests
+    core.requests.Session.assert_called_once()
+    assert session.get.call_count == 2
+
+def test_lyrics_client_from_env(mocker):
+    # Mock os.getenv
+    mocker.patch('songs2slides.core.os.getenv')
+    core.os.getenv.side_effect = lambda key, default=None: {
+        'API_URL': 'api://lyrics/{artist}/{title}',
+        'API_AUTH': 'Bearer secrettoken',
+        'API_READ_TIMEOUT': '30',
+        'API_BATCH_URL': 'api://batch',
+    }.get(key, default)
+
+    # Create client
+    client = core.LyricsClient.from_env()
+
+    # Assert client is configured correctly
+    assert client.url == 'api://lyrics/{artist}/{title}'
+    assert client.batch_url == 'api://batch'
+    assert client.batch_size == 50
+    assert client.timeout == (5, 30)
+    assert client.session.headers['Authorization'] == 'Bearer secrettoken'
+
+def test_lyrics_client_from_env_no_url(mocker):
+    # Mock os.getenv
+    mocker.patch('songs2slides.core.os.getenv')
+    core.os.getenv.return_value = None
+
+    # Try to create client
+    with pytest.raises(Exception):
+        core.LyricsClient.from_env()
+
+def test_lyrics_client_not_found(mocker):
+    # Mock requests.Session
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    session.get.return_value.status_code = 404
+
+    # Try to get song data
+    client = core.LyricsClient('api://lyrics/{artist}/{title}')
+    with pytest.raises(core.SongNotFound):
+        client.get_song_data('foo', 'bar')
+
+def test_lyrics_client_invalid_data(mocker):
+    # Mock requests.Session
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    session.get.return_value.json.return_value = {}
+    session.get.return_value.status_code = 200
+
+    # Try to get song data
+    client = core.LyricsClient('api://lyrics/{artist}/{title}')
+    with pytest.raises(Exception):
+        client.get_song_data('foo', 'bar')
+
+    # Assert request was called
+    session.get.assert_called_with('api://lyrics/bar/foo', timeout=(5, 15))
+
+def test_lyrics_client_rate_limited(mocker):
+    # Mock requests.Session and rate limiter
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    limited = mocker.Mock(status_code=429, headers={ 'Retry-After': '3' })
+    found = mocker.Mock(status_code=200)
+    found.json.return_value = { 'lyrics': 'L', 'title': 'T', 'artist': 'A' }
+    session.get.side_effect = [limited, found]
+    limiter = mocker.Mock()
 
     # Get song data
-    song_data = core.get_song_data('foo', 'bar')
+    client = core.LyricsClient('api://lyrics/{artist}/{title}',
+                               limiter=limiter)
+    song_data = client.get_song_data('foo', 'bar')
+
+    # Assert requests waited for the limiter and paused after the 429
+    assert limiter.acquire.call_count == 2
+    limiter.block.assert_called_once_with(3)
+    assert session.get.call_count == 2
+    assert song_data == core.SongData('T', 'A', 'L')
+
+def test_lyrics_client_rate_limited_exhausted(mocker):
+    # Mock requests.Session and rate limiter
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    session.get.return_value.status_code = 429
+    session.get.return_value.headers = {}
+    limiter = mocker.Mock()
 
-    # Assert mocked methods were used correctly
-    core.os.getenv.assert_has_calls([
-        mocker.call('API_URL'),
-        mocker.call('API_AUTH', None)
+    # Try to get song data
+    client = core.LyricsClient('api://lyrics/{artist}/{title}', retries=1,
+                               limiter=limiter)
+    with pytest.raises(ratelimit.RateLimited):
+        client.get_song_data('foo', 'bar')
+
+    # Assert request was retried once
+    assert session.get.call_count == 2
+    assert limiter.block.call_args_list == [mocker.call(1), mocker.call(1)]
+
+def test_lyrics_client_rate_limited_without_limiter(mocker):
+    # Mock requests.Session that is still limited after urllib3's retries
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    session.get.return_value.status_code = 429
+
+    # Assert request is reported as rate limited rather than failed
+    client = core.LyricsClient('api://lyrics/{artist}/{title}')
+    with pytest.raises(ratelimit.RateLimited):
+        client.get_song_data('foo', 'bar')
+
+def mock_provider(mocker, result, delay=0):
+    # Mock lyrics API client that answers after a delay
+    def get_song_data(title, artist):
+        time.sleep(delay)
+        if isinstance(result, Exception): raise result
+        return result
+    client = mocker.Mock()
+    client.get_song_data.side_effect = get_song_data
+    return client
+
+def test_hedged_lyrics_client_primary(mocker):
+    # Mock lyrics API clients
+    primary = mock_provider(mocker, core.SongData('T', 'A', 'primary'))
+    secondary = mock_provider(mocker, core.SongData('T', 'A', 'secondary'))
+    client = core.HedgedLyricsClient([primary, secondary], hedge_delay=5)
+
+    # Get song data
+    song_data = client.get_song_data('foo', 'bar')
+
+    # Assert only the primary API was queried
+    assert song_data == core.SongData('T', 'A', 'primary')
+    primary.get_song_data.assert_called_once_with('foo', 'bar')
+    secondary.get_song_data.assert_not_called()
+
+def test_hedged_lyrics_client_hedges(mocker):
+    # Mock lyrics API clients with a slow primary API
+    primary = mock_provider(mocker, core.SongData('T', 'A', 'primary'), 1)
+    secondary = mock_provider(mocker, core.SongData('T', 'A', 'secondary'))
+    client = core.HedgedLyricsClient([primary, secondary], hedge_delay=0.05)
+
+    # Get song data
+    start = time.monotonic()
+    song_data = client.get_song_data('foo', 'bar')
+
+    # Assert the faster answer was returned without waiting for the primary API
+    assert time.monotonic() - start < 0.5
+    assert song_data == core.SongData('T', 'A', 'secondary')
+    secondary.get_song_data.assert_called_once_with('foo', 'bar')
+
+def test_hedged_lyrics_client_saturated_primary(mocker):
+    # Mock lyrics API clients with a slow primary API
+    release = threading.Event()
+    def slow(title, artist):
+        release.wait(5)
+        return core.SongData('T', 'A', 'primary')
+    primary = mocker.Mock()
+    primary.get_song_data.side_effect = slow
+    secondary = mock_provider(mocker, core.SongData('T', 'A', 'secondary'))
+    client = core.HedgedLyricsClient([primary, secondary], hedge_delay=0.1,
+                                     max_workers=8)
+
+    # Get song data for more songs at once than there are threads per API
+    def get(i):
+        start = time.monotonic()
+        song_data = client.get_song_data(f'foo{i}', 'bar')
+        return song_data, time.monotonic() - start
+    try:
+        with ThreadPoolExecutor(40) as executor:
+            results = list(executor.map(get, range(40)))
+    finally:
+        release.set()
+
+    # Assert every lookup was answered by the secondary API without waiting
+    # for the primary API
+    assert [x[0] for x in results] == \
+        [core.SongData('T', 'A', 'secondary')] * 40
+    assert max(x[1] for x in results) < 1
+
+@pytest.mark.parametrize('error', [core.SongNotFound(), Exception('error')])
+def test_hedged_lyrics_client_falls_through(mocker, error):
+    # Mock lyrics API clients with a primary API that can't answer
+    primary = mock_provider(mocker, error)
+    secondary = mock_provider(mocker, core.SongData('T', 'A', 'secondary'))
+    client = core.HedgedLyricsClient([primary, secondary], hedge_delay=5)
+
+    # Get song data
+    start = time.monotonic()
+    song_data = client.get_song_data('foo', 'bar')
+
+    # Assert the next API was queried without waiting for the hedge delay
+    assert time.monotonic() - start < 1
+    assert song_data == core.SongData('T', 'A', 'secondary')
+
+def test_hedged_lyrics_client_not_found(mocker):
+    # Mock lyrics API clients
+    client = core.HedgedLyricsClient([
+        mock_provider(mocker, core.SongNotFound()),
+        mock_provider(mocker, core.SongNotFound()),
     ])
-    core.requests.get.assert_called_with('api://lyrics/bar/foo', headers={})
-    core.filter_lyrics.assert_called_with('raw')
 
-    # Assert song data is correct
-    assert song_data.title == 'Foo'
-    assert song_data.artist == 'Bar'
-    assert song_data.lyrics == 'clean'
+    # Assert SongNotFound is raised
+    with pytest.raises(core.SongNotFound):
+        client.get_song_data('foo', 'bar')
+
+def test_hedged_lyrics_client_error(mocker):
+    # Mock lyrics API clients
+    client = core.HedgedLyricsClient([
+        mock_provider(mocker, Exception('API error')),
+        mock_provider(mocker, core.SongNotFound()),
+    ])
+
+    # Assert the API error is raised, since the song may exist
+    with pytest.raises(Exception, match='API error'):
+        client.get_song_data('foo', 'bar')
+
+def test_client_from_env(monkeypatch):
+    # Mock environment
+    monkeypatch.setenv('API_URL', 'api://first/{title}')
+    monkeypatch.setenv('API_URL_2', 'api://second/{title}')
+    monkeypatch.setenv('API_AUTH_2', 'Bearer secrettoken')
+    monkeypatch.setenv('API_HEDGE_DELAY', '0.5')
+    monkeypatch.delenv('API_URL_3', raising=False)
+
+    # Create client
+    client = core.client_from_env()
+
+    # Assert APIs are configured in order
+    assert isinstance(client, core.HedgedLyricsClient)
+    assert [x.url for x in client.clients] == ['api://first/{title}',
+                                               'api://second/{title}']
+    assert client.clients[1].session.headers['Authorization'] == \
+        'Bearer secrettoken'
+    assert client.hedge_delay == 0.5
+
+def test_client_from_env_single(monkeypatch):
+    # Mock environment
+    monkeypatch.setenv('API_URL', 'api://first/{title}')
+    monkeypatch.delenv('API_URL_2', raising=False)
+
+    # Assert a single API doesn't use hedging
+    assert isinstance(core.client_from_env(), core.LyricsClient)
+
+def test_lyrics_client_batch(mocker):
+    # Mock requests.Session
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    session.post.return_value.json.return_value = [
+        { 'title': 'Foo', 'artist': 'Bar', 'lyrics': 'l1[remove]' },
+        None,
+    ]
+
+    # Get song data
+    client = core.LyricsClient('api://lyrics/{artist}/{title}',
+                               batch_url='api://batch')
+    results = client.get_many_song_data([('foo', 'bar'), ('baz', 'bar')])
+
+    # Assert request and results are correct
+    session.post.assert_called_with('api://batch', json=[
+        { 'title': 'foo', 'artist': 'bar' },
+        { 'title': 'baz', 'artist': 'bar' },
+    ], timeout=(5, 15))
+    assert results[0] == core.SongData('Foo', 'Bar', 'l1')
+    assert isinstance(results[1], core.SongNotFound)
+
+@pytest.mark.parametrize('data', [{}, [None], [None, {}]])
+def test_lyrics_client_batch_invalid_data(mocker, data):
+    # Mock requests.Session
+    mocker.patch('songs2slides.core.requests.Session')
+    session = core.requests.Session.return_value
+    session.post.return_value.json.return_value = data
+
+    # Try to get song data
+    client = core.LyricsClient('api://lyrics/{artist}/{title}',
+                               batch_url='api://batch')
+    with pytest.raises(Exception):
+        client.get_many_song_data([('foo', 'bar'), ('baz', 'bar')])
+
+def test_get_song_data_uses_shared_client(mocker):
+    # Mock LyricsClient.from_env
+    mocker.patch('songs2slides.core.LyricsClient.from_env')
+    client = core.LyricsClient.from_env.return_value
+    client.get_song_data.return_value = core.SongData('Foo', 'Bar', 'lyrics')
+
+    # Get song data twice
+    core.get_song_data('foo', 'bar')
+    song_data = core.get_song_data('foo', 'bar')
+
+    # Assert client was only created once
+    core.LyricsClient.from_env.assert_called_once()
+    client.get_song_data.assert_called_with('foo', 'bar')
+    assert song_data == core.SongData('Foo', 'Bar', 'lyrics')
 
 def test_get_song_data_no_url(mocker):
-    # Mock os.getenv and requests.get
+    # Mock os.getenv and requests.Session
     mocker.patch('songs2slides.core.os.getenv')
-    mocker.patch('songs2slides.core.requests.get')
+    mocker.patch('songs2slides.core.requests.Session')
     core.os.getenv.return_value = None
-    core.requests.get.return_value.text = b'{}'
-    core.requests.get.return_value.status_code = 200
 
     # Try to get song data
     with pytest.raises(Exception):
         song_data = core.get_song_data('foo', 'bar')
 
     # Assert request was not called
-    core.requests.get.assert_not_called()
+    core.requests.Session.return_value.get.assert_not_called()
+
+def test_get_song_data_cached(mocker):
+    # Mock lyrics API client
+    client = mocker.Mock()
+    client.get_song_data.return_value = core.SongData('Foo', 'Bar', 'lyrics')
+    core.set_client(client)
+
+    # Get song data twice, with different capitalization and spacing
+    first = core.get_song_data('foo', 'bar')
+    first.lyrics = 'modified'
+    second = core.get_song_data(' Foo ', 'BAR')
+
+    # Assert API was only queried once
+    client.get_song_data.assert_called_once_with('foo', 'bar')
+    assert second == core.SongData('Foo', 'Bar', 'lyrics')
+    assert core.get_cache().stats() == { 'hits': 1, 'misses': 1, 'size': 1 }
+
+def test_get_song_data_cleaned(mocker):
+    # Mock lyrics API client and set cleaning rules
+    client = mocker.Mock()
+    client.get_song_data.return_value = core.SongData('Foo', 'Bar', 'l1 x2')
+    core.set_client(client)
+    core.set_rules(rules.RuleSet(rules.BUILT_IN['repeat-markers']))
 
-def test_get_song_data_not_found(mocker):
-    # Mock os.getenv and requests.get
-    mocker.patch('songs2slides.core.os.getenv')
-    mocker.patch('songs2slides.core.requests.get')
-    core.os.getenv.side_effect = [
-        'api://lyrics/{artist}/{title}',
-        'Bearer secrettoken'
+    # Get song data
+    song_data = core.get_song_data('foo', 'bar')
+
+    # Assert lyrics are cleaned, but cached as they were found
+    assert song_data == core.SongData('Foo', 'Bar', 'l1')
+    assert core.get_cache().get(cache.make_key('foo', 'bar'))['lyrics'] == \
+        'l1 x2'
+
+def test_get_song_data_cached_not_found(mocker):
+    # Mock lyrics API client
+    client = mocker.Mock()
+    client.get_song_data.side_effect = core.SongNotFound()
+    core.set_client(client)
+
+    # Try to get song data twice
+    with pytest.raises(core.SongNotFound):
+        core.get_song_data('foo', 'bar')
+    with pytest.raises(core.SongNotFound):
+        core.get_song_data('foo', 'bar')
+
+    # Assert API was only queried once
+    client.get_song_data.assert_called_once_with('foo', 'bar')
+
+def test_get_song_data_errors_not_cached(mocker):
+    # Mock lyrics API client
+    client = mocker.Mock()
+    client.get_song_data.side_effect = [
+        Exception('API error'),
+        core.SongData('Foo', 'Bar', 'lyrics'),
     ]
-    core.requests.get.return_value.text = b'{}'
-    core.requests.get.return_value.status_code = 200
+    core.set_client(client)
 
-    # Try to get song data
+    # Get song data after an API error
     with pytest.raises(Exception):
-        song_data = core.get_song_data('foo', 'bar')
+        core.get_song_data('foo', 'bar')
+    song_data = core.get_song_data('foo', 'bar')
 
-    # Assert request was called
-    core.requests.get.assert_called_with('api://lyrics/bar/foo', headers={
-        'Authorization': 'Bearer secrettoken'
-    })
+    # Assert API was queried again
+    assert client.get_song_data.call_count == 2
+    assert song_data == core.SongData('Foo', 'Bar', 'lyrics')
+
+def test_get_song_data_circuit_open(mocker):
+    # Mock lyrics API client that always fails
+    client = mocker.Mock()
+    client.get_song_data.side_effect = Exception('API error')
+    core.set_client(client)
+    core.set_breaker(breaker.CircuitBreaker(failure_threshold=2,
+                                            ignore=(core.SongNotFound,)))
+
+    # Get song data until the circuit opens
+    for _ in range(2):
+        with pytest.raises(Exception, match='API error'):
+            core.get_song_data('foo', 'bar')
+    with pytest.raises(breaker.CircuitOpen):
+        core.get_song_data('foo', 'bar')
+
+    # Assert API was not queried once the circuit opened
+    assert client.get_song_data.call_count == 2
+    assert core.get_breaker().state == 'open'
+
+def test_get_song_data_not_found_not_failure(mocker):
+    # Mock lyrics API client
+    client = mocker.Mock()
+    client.get_song_data.side_effect = core.SongNotFound()
+    core.set_client(client)
+    core.set_breaker(breaker.CircuitBreaker(failure_threshold=1,
+                                            ignore=(core.SongNotFound,)))
+
+    # Get song data
+    with pytest.raises(core.SongNotFound):
+        core.get_song_data('foo', 'bar')
+
+    # Assert circuit is still closed
+    assert core.get_breaker().state == 'closed'
+
+def test_get_song_data_rate_limited_skipped(mocker):
+    # Mock lyrics API client that sheds requests
+    client = mocker.Mock()
+    client.get_song_data.side_effect = ratelimit.RateLimited()
+    core.set_client(client)
+    core.set_breaker(breaker.CircuitBreaker(failure_threshold=1,
+                                            skip=(ratelimit.RateLimited,)))
+
+    # Get song data
+    with pytest.raises(ratelimit.RateLimited):
+        core.get_song_data('foo', 'bar')
+
+    # Assert circuit is still closed and nothing was cached
+    assert core.get_breaker().state == 'closed'
+    assert core.get_cache().get(cache.make_key('foo', 'bar')) is cache.MISS
+
+def test_get_song_data_coalesced(mocker):
+    # Mock lyrics API client with a slow response
+    started = threading.Event()
+    release = threading.Event()
+    def get_song_data(title, artist):
+        started.set()
+        release.wait(5)
+        return core.SongData('Foo', 'Bar', 'lyrics')
+    client = mocker.Mock()
+    client.get_song_data.side_effect = get_song_data
+    core.set_client(client)
+
+    # Get song data from several threads at once
+    with ThreadPoolExecutor(3) as executor:
+        first = executor.submit(core.get_song_data, 'foo', 'bar')
+        started.wait(5)
+        others = [executor.submit(core.get_song_data, 'Foo', 'BAR')
+                  for _ in range(2)]
+        time.sleep(0.1)
+        release.set()
+        results = [first.result()] + [x.result() for x in others]
+
+    # Assert API was only queried once
+    client.get_song_data.assert_called_once_with('foo', 'bar')
+    assert results == [core.SongData('Foo', 'Bar', 'lyrics')] * 3
+
+def test_get_song_data_coalesced_not_found(mocker):
+    # Mock lyrics API client with a slow response
+    started = threading.Event()
+    release = threading.Event()
+    def get_song_data(title, artist):
+        started.set()
+        release.wait(5)
+        raise core.SongNotFound()
+    client = mocker.Mock()
+    client.get_song_data.side_effect = get_song_data
+    core.set_client(client)
+
+    # Get song data from two threads at once
+    with ThreadPoolExecutor(2) as executor:
+        first = executor.submit(core.get_song_data, 'foo', 'bar')
+        started.wait(5)
+        second = executor.submit(core.get_song_data, 'foo', 'bar')
+        time.sleep(0.1)
+        release.set()
+
+        # Assert both lookups raise SongNotFound
+        with pytest.raises(core.SongNotFound):
+            first.result()
+        with pytest.raises(core.SongNotFound):
+            second.result()
+
+    # Assert API was only queried once
+    client.get_song_data.assert_called_once()
+
+def test_iter_many_song_data_as_completed(mocker):
+    # Mock get_song_data with a slow first song
+    release = threading.Event()
+    def get_song_data(title, artist):
+        if title == 't1': release.wait(5)
+        return core.SongData(title, artist, 'lyrics')
+    mocker.patch('songs2slides.core.get_song_data')
+    core.get_song_data.side_effect = get_song_data
+
+    # Get song data
+    results = core.iter_many_song_data([('t1', 'a1'), ('t2', 'a2')])
+
+    # Assert faster songs are yielded first
+    assert next(results) == (1, core.SongData('t2', 'a2', 'lyrics'))
+    release.set()
+    assert next(results) == (0, core.SongData('t1', 'a1', 'lyrics'))
+    assert list(results) == []
+
+def test_get_many_song_data_deadline(mocker):
+    # Mock get_song_data with a slow first song
+    release = threading.Event()
+    def get_song_data(title, artist):
+        if title == 't1': release.wait(5)
+        return core.SongData(title, artist, 'lyrics')
+    mocker.patch('songs2slides.core.get_song_data')
+    core.get_song_data.side_effect = get_song_data
+
+    # Get song data
+    try:
+        results = core.get_many_song_data([('t1', 'a1'), ('t2', 'a2')],
+                                          deadline=0.1)
+    finally:
+        release.set()
+
+    # Assert slow song was given up on
+    assert isinstance(results[0], TimeoutError)
+    assert results[1] == core.SongData('t2', 'a2', 'lyrics')
+
+def test_get_many_song_data_preserves_order(mocker):
+    # Mock get_song_data
+    mocker.patch('songs2slides.core.get_song_data')
+    core.get_song_data.side_effect = lambda title, artist: \
+        core.SongData(title.upper(), artist.upper(), 'lyrics')
+
+    # Get song data
+    results = core.get_many_song_data([('t1', 'a1'), ('t2', 'a2'),
+                                       ('t3', 'a3')])
+
+    # Assert song data is correct
+    assert results == [
+        core.SongData('T1', 'A1', 'lyrics'),
+        core.SongData('T2', 'A2', 'lyrics'),
+        core.SongData('T3', 'A3', 'lyrics'),
+    ]
+
+def test_get_many_song_data_errors(mocker):
+    # Mock get_song_data
+    mocker.patch('songs2slides.core.get_song_data')
+    not_found = core.SongNotFound()
+    error = Exception('API error')
+    def get_song_data(title, artist):
+        if title == 't1': raise not_found
+        if title == 't2': raise error
+        return core.SongData(title, artist, 'lyrics')
+    core.get_song_data.side_effect = get_song_data
+
+    # Get song data
+    results = core.get_many_song_data([('t1', 'a1'), ('t2', 'a2'),
+                                       ('t3', 'a3')])
+
+    # Assert each song has its own outcome
+    assert results == [not_found, error, core.SongData('t3', 'a3', 'lyrics')]
+
+def mock_batch_client(mocker, batch_size=50):
+    # Mock lyrics API client with batch lookups
+    client = mocker.Mock(spec=core.LyricsClient, batch_url='api://batch',
+                         batch_size=batch_size)
+    client.get_many_song_data.side_effect = lambda songs: [
+        core.SongNotFound() if title == 'missing' else
+        core.SongData(title.upper(), artist, 'lyrics') for title, artist in songs
+    ]
+    core.set_client(client)
+    return client
+
+def test_get_many_song_data_batch(mocker):
+    # Mock lyrics API client and cache a song
+    client = mock_batch_client(mocker, batch_size=2)
+    core.get_cache().set(cache.make_key('t1', 'a'),
+                         asdict(core.SongData('T1', 'a', 'cached')))
+
+    # Get song data
+    results = core.get_many_song_data([('t1', 'a'), ('t2', 'a'),
+                                       ('missing', 'a'), ('T2', 'a'),
+                                       ('t3', 'a')])
+
+    # Assert uncached songs were looked up in batches
+    assert client.get_many_song_data.call_args_list == [
+        mocker.call([('t2', 'a'), ('missing', 'a')]),
+        mocker.call([('t3', 'a')]),
+    ]
+    client.get_song_data.assert_not_called()
+    assert results[0] == core.SongData('T1', 'a', 'cached')
+    assert results[1] == results[3] == core.SongData('T2', 'a', 'lyrics')
+    assert isinstance(results[2], core.SongNotFound)
+    assert results[4] == core.SongData('T3', 'a', 'lyrics')
+
+    # Assert results were cached
+    client.get_many_song_data.reset_mock()
+    assert core.get_song_data('t3', 'a') == core.SongData('T3', 'a', 'lyrics')
+    with pytest.raises(core.SongNotFound):
+        core.get_song_data('missing', 'a')
+    client.get_song_data.assert_not_called()
+
+def test_get_many_song_data_batch_error(mocker):
+    # Mock lyrics API client
+    client = mock_batch_client(mocker)
+    error = Exception('API error')
+    client.get_many_song_data.side_effect = error
+
+    # Get song data
+    results = core.get_many_song_data([('t1', 'a'), ('t2', 'a')])
+
+    # Assert error is returned for each song and not cached
+    assert results == [error, error]
+    assert core.get_cache().get(cache.make_key('t1', 'a')) is cache.MISS
+
+def test_get_many_song_data_batch_deadline(mocker):
+    # Mock lyrics API client with a slow second batch
+    client = mock_batch_client(mocker, batch_size=1)
+    get_many_song_data = client.get_many_song_data.side_effect
+    release = threading.Event()
+    def slow_get_many_song_data(songs):
+        if songs[0][0] == 't2': release.wait(2)
+        return get_many_song_data(songs)
+    client.get_many_song_data.side_effect = slow_get_many_song_data
+
+    # Get song data
+    start = time.monotonic()
+    results = core.get_many_song_data([('t1', 'a'), ('t2', 'a'), ('t3', 'a')],
+                                      deadline=0.3)
+
+    # Assert the slow request was given up on at the deadline
+    assert time.monotonic() - start < 1
+    assert results[0] == core.SongData('T1', 'a', 'lyrics')
+    assert isinstance(results[1], TimeoutError)
+    assert isinstance(results[2], TimeoutError)
+    assert client.get_many_song_data.call_count == 2
+
+    # Assert the slow request still caches its result once it finishes
+    release.set()
+    for _ in range(100):
+        if core._in_flight == {}: break
+        time.sleep(0.01)
+    assert core._in_flight == {}
+    assert core.get_cache().get(cache.make_key('t2', 'a')) == \
+        asdict(core.SongData('T2', 'a', 'lyrics'))
+
+def test_iter_many_song_data_batch_stopped(mocker):
+    # Mock lyrics API client
+    mock_batch_client(mocker, batch_size=1)
+
+    # Stop iterating after the first batch
+    results = core.iter_many_song_data([('t1', 'a'), ('t2', 'a')])
+    next(results)
+    results.close()
+
+    # Assert no lookups were left in flight
+    assert core._in_flight == {}
+
+def test_get_many_song_data_no_batch_url(mocker):
+    # Mock lyrics API client without batch lookups
+    client = mocker.Mock(spec=core.LyricsClient, batch_url=None)
+    client.get_song_data.side_effect = lambda title, artist: \
+        core.SongData(title, artist, 'lyrics')
+    core.set_client(client)
+
+    # Get song data
+    results = core.get_many_song_data([('t1', 'a1'), ('t2', 'a2')])
+
+    # Assert songs were looked up one at a time
+    assert client.get_song_data.call_count == 2
+    client.get_many_song_data.assert_not_called()
+    assert results == [core.SongData('t1', 'a1', 'lyrics'),
+                       core.SongData('t2', 'a2', 'lyrics')]
+
+def test_get_many_song_data_no_songs(mocker):
+    # Mock get_song_data
+    mocker.patch('songs2slides.core.get_song_data')
+
+    # Get song data
+    results = core.get_many_song_data([])
+
+    # Assert no requests were made
+    assert results == []
+    core.get_song_data.assert_not_called()
+
+def test_prefetch_song_data(mocker):
+    # Mock lyrics API client and prefetch executor
+    client = mocker.Mock()
+    client.get_song_data.return_value = core.SongData('Foo', 'Bar', 'lyrics')
+    core.set_client(client)
+    executor = ThreadPoolExecutor(1)
+    mocker.patch('songs2slides.core._prefetch_executor', executor)
+
+    # Prefetch song data and wait for it to finish
+    assert core.prefetch_song_data('foo', 'bar')
+    executor.shutdown(wait=True)
+
+    # Assert later lookups are served from the cache
+    assert core.get_song_data('foo', 'bar') == \
+        core.SongData('Foo', 'Bar', 'lyrics')
+    client.get_song_data.assert_called_once_with('foo', 'bar')
+
+def test_prefetch_song_data_ignores_errors(mocker):
+    # Mock lyrics API client and prefetch executor
+    client = mocker.Mock()
+    client.get_song_data.side_effect = [
+        Exception('API error'),
+        core.SongData('Foo', 'Bar', 'lyrics'),
+    ]
+    core.set_client(client)
+    executor = ThreadPoolExecutor(1)
+    mocker.patch('songs2slides.core._prefetch_executor', executor)
+
+    # Prefetch song data and wait for it to finish
+    assert core.prefetch_song_data('foo', 'bar')
+    executor.shutdown(wait=True)
+
+    # Assert later lookups query the API again
+    assert core.get_song_data('foo', 'bar') == \
+        core.SongData('Foo', 'Bar', 'lyrics')
+    assert client.get_song_data.call_count == 2
+
+def test_prefetch_song_data_sheds_load(mocker):
+    # Mock prefetch executor and fill prefetch slots
+    mocker.patch('songs2slides.core._prefetch_executor')
+    mocker.patch('songs2slides.core._prefetch_slots',
+                 threading.BoundedSemaphore(1))
+    assert core.prefetch_song_data('foo', 'bar')
+
+    # Assert further prefetches are dropped
+    assert not core.prefetch_song_data('baz', 'qux')
+    core._prefetch_executor.submit.assert_called_once()
 
 def test_parse_song_lyrics_basic():
     # Declare song data and expected slides
@@ -255,10 +984,60 @@ def test_parse_song_lyrics_extra_newlines():
     # Assert slides are correct
     assert result == expected
 
-def test_assemble_slides_calls_parse_song_lyrics(mocker):
-    # Mock parse_song_lyrics
-    mocker.patch('songs2slides.core.parse_song_lyrics')
-    core.parse_song_lyrics.side_effect = [['aaa'], ['b1', 'b2']]
+def parse_song_lyrics_reference(lyrics, lines_per_slide):
+    # Original string concatenation implementation of parse_song_lyrics
+    slides = ['']
+    line_count = 0
+    for line in lyrics.strip().split('\n'):
+        line = line.strip()
+        if line == '':
+            if line_count != 0 or len(slides) < 2 or slides[-2] != '':
+                slides += ['']
+                line_count = 0
+        elif lines_per_slide is None or line_count < lines_per_slide:
+            if line_count != 0: slides[-1] += '\n'
+            slides[-1] += line
+            line_count += 1
+        else:
+            slides += [line]
+            line_count = 1
+    if slides == ['', '']: slides = []
+    return slides
+
+@given(lyrics=st.text(alphabet='AB \n\t'),
+       lines_per_slide=st.none() | st.integers(min_value=0, max_value=5))
+def test_parse_song_lyrics_matches_reference(lyrics, lines_per_slide):
+    # Assert slides match the original implementation
+    assert core.parse_song_lyrics(lyrics, lines_per_slide) == \
+        parse_song_lyrics_reference(lyrics, lines_per_slide)
+
+def test_parse_song_lyrics_long_stanza():
+    # Declare song data with a very long stanza and expected slides
+    lyrics = '\n'.join(['A'] * 100000)
+    expected = ['\n'.join(['A'] * 100000)]
+
+    # Get slide content
+    result = core.parse_song_lyrics(lyrics, None)
+
+    # Assert slides are correct
+    assert result == expected
+
+def test_iter_song_slides():
+    # Declare song data and expected slides
+    lyrics = 'A\nB\nC\nD\nE\nF\n\nG\nH'
+    expected = ['A\nB\nC\nD', 'E\nF', 'G\nH']
+
+    # Get slide content one slide at a time
+    result = core.iter_song_slides(lyrics, 4)
+
+    # Assert slides are correct
+    assert next(result) == expected[0]
+    assert list(result) == expected[1:]
+
+def test_assemble_slides_calls_iter_song_slides(mocker):
+    # Mock iter_song_slides
+    mocker.patch('songs2slides.core.iter_song_slides')
+    core.iter_song_slides.side_effect = [iter(['aaa']), iter(['b1', 'b2'])]
 
     # Declare song data and expected slides
     songs = [
@@ -273,11 +1052,29 @@ def test_assemble_slides_calls_parse_song_lyrics(mocker):
     # Assert slides are correct
     assert slides == expected
 
-    # Assert parse_song_lyrics called
-    core.parse_song_lyrics.assert_has_calls([
+    # Assert iter_song_slides called
+    core.iter_song_slides.assert_has_calls([
         mocker.call('L1', 4), mocker.call('L2', 4)
     ])
 
+def test_iter_slides_lazy():
+    # Declare songs that are only created when needed
+    created = []
+    def songs():
+        for i in range(1, 3):
+            created.append(i)
+            yield core.SongData(f't{i}', f'a{i}', f'l{i}')
+
+    # Get slides one slide at a time
+    result = core.iter_slides(songs())
+
+    # Assert songs are assembled as slides are consumed
+    assert next(result) == 'T1'
+    assert next(result) == 'L1'
+    assert created == [1]
+    assert list(result) == ['', 'T2', 'L2']
+    assert created == [1, 2]
+
 def test_assemble_slides_default():
     # Declare song data and expected slides
     songs = [
@@ -296,9 +1093,9 @@ def test_assemble_slides_default():
     assert slides == expected
 
 def test_assemble_slides_custom_lines_per_slide(mocker):
-    # Mock parse_song_lyrics
-    mocker.patch('songs2slides.core.parse_song_lyrics')
-    core.parse_song_lyrics.side_effect = [['aaa'], ['b1', 'b2']]
+    # Mock iter_song_slides
+    mocker.patch('songs2slides.core.iter_song_slides')
+    core.iter_song_slides.side_effect = [iter(['aaa']), iter(['b1', 'b2'])]
 
     # Declare song data and expected slides
     songs = [
@@ -313,8 +1110,8 @@ def test_assemble_slides_custom_lines_per_slide(mocker):
     # Assert slides are correct
     assert slides == expected
 
-    # Assert parse_song_lyrics called correctly
-    core.parse_song_lyrics.assert_has_calls([
+    # Assert iter_song_slides called correctly
+    core.iter_song_slides.assert_has_calls([
         mocker.call('L1', 3), mocker.call('L2', 3)
     ])
 
@@ -380,6 +1177,9 @@ def test_assemble_slides_no_songs():
     assert slides == expected
 
 def test_create_pptx(mocker):
+    # Create empty PowerPoint before mocking Presentation.save
+    core.get_base_pptx()
+
     # Mock Presentation.save
     mocker.patch('songs2slides.core.pptx.presentation.Presentation.save')
 
@@ -388,3 +1188,37 @@ def test_create_pptx(mocker):
 
     # Assert PowerPoint was saved
     core.pptx.presentation.Presentation.save.assert_called_with('test.pptx')
+
+def test_create_pptx_stream():
+    # Create PowerPoint in memory
+    f = io.BytesIO()
+    core.create_pptx(['A', 'B\nC', 'D'], f)
+
+    # Assert PowerPoint is valid and contains the slides (with line breaks)
+    f.seek(0)
+    prs = core.pptx.Presentation(f)
+    assert [x.shapes[0].text_frame.text for x in prs.slides] == \
+        ['A', 'B\vC', 'D']
+
+def test_create_pptx_base_cached(mocker):
+    # Mock Presentation
+    core.get_base_pptx()
+    mocker.patch('songs2slides.core.pptx.Presentation',
+                 wraps=core.pptx.Presentation)
+
+    # Create two PowerPoints
+    core.create_pptx(['A'], io.BytesIO())
+    core.create_pptx(['B'], io.BytesIO())
+
+    # Assert both were copied from the cached empty PowerPoint
+    for call in core.pptx.Presentation.call_args_list:
+        assert call.args[0].getvalue() == core.get_base_pptx()
+
+def test_get_base_pptx():
+    # Open empty PowerPoint
+    prs = core.pptx.Presentation(io.BytesIO(core.get_base_pptx()))
+
+    # Assert PowerPoint is empty and 16:9
+    assert len(prs.slides) == 0
+    assert (prs.slide_width, prs.slide_height) == \
+        (core.Inches(11), core.Inches(6.1875))
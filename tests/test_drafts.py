@@ -0,0 +1,51 @@
+from songs2slides import core, drafts
+
+def test_draft_store(tmp_path):
+    # Store draft
+    store = drafts.DraftStore(str(tmp_path / 'drafts.db'))
+    songs = [core.SongData('T1', 'A1', 'L1'), core.SongData('T2', 'A2', None)]
+    draft_id = store.create(songs)
+
+    # Assert draft can be read, including from another store
+    assert store.get(draft_id) == songs
+    assert drafts.DraftStore(str(tmp_path / 'drafts.db')).get(draft_id) == \
+        songs
+    assert store.get('unknown') is None
+
+def test_draft_store_ids_unique(tmp_path):
+    # Assert each draft gets its own id
+    store = drafts.DraftStore(str(tmp_path / 'drafts.db'))
+    assert store.create([]) != store.create([])
+
+def test_draft_store_ttl(tmp_path, mocker):
+    # Store draft
+    mocker.patch('songs2slides.cache.time.time', return_value=1000)
+    store = drafts.DraftStore(str(tmp_path / 'drafts.db'), ttl=60)
+    draft_id = store.create([core.SongData('T1', 'A1', 'L1')])
+
+    # Assert draft expires
+    mocker.patch('songs2slides.cache.time.time', return_value=1059)
+    assert store.get(draft_id) is not None
+    mocker.patch('songs2slides.cache.time.time', return_value=1061)
+    assert store.get(draft_id) is None
+
+def test_draft_store_max_size(tmp_path):
+    # Store more drafts than fit
+    store = drafts.DraftStore(str(tmp_path / 'drafts.db'), max_size=2)
+    draft_ids = [store.create([]) for _ in range(3)]
+
+    # Assert oldest draft was removed
+    assert store.get(draft_ids[0]) is None
+    assert store.get(draft_ids[1]) == []
+    assert store.get(draft_ids[2]) == []
+
+def test_from_env(tmp_path, monkeypatch):
+    # Assert draft store is created at DRAFT_PATH
+    monkeypatch.setenv('DRAFT_PATH', str(tmp_path / 'drafts.db'))
+    assert isinstance(drafts.from_env(), drafts.DraftStore)
+    assert (tmp_path / 'drafts.db').exists()
+
+def test_from_env_disabled(monkeypatch):
+    # Assert drafts can be disabled
+    monkeypatch.setenv('DRAFT_PATH', '')
+    assert drafts.from_env() is None
@@ -0,0 +1,73 @@
+import io
+import pytest
+import re
+import zipfile
+
+from songs2slides import core, fastpptx
+
+SLIDES = [
+    'TITLE',
+    'A\nB & <C>',
+    '',
+    '\nA\n',
+    'A\n\n\nB',
+    'A\vB',
+    'CONTROL\x01\tCHARS',
+    'UNICODE É "\'',
+    '  SPACES  ',
+]
+
+def create_both(slides):
+    # Create PowerPoint with both builders
+    expected = io.BytesIO()
+    core.create_pptx(slides, expected)
+    result = io.BytesIO()
+    fastpptx.create_pptx(slides, result)
+    return zipfile.ZipFile(expected), zipfile.ZipFile(result)
+
+def content_types(package):
+    # Parse content type overrides
+    types = package.read('[Content_Types].xml').decode('utf-8')
+    return set(re.findall(r'<Override [^>]*/>', types))
+
+@pytest.mark.parametrize('slides', [SLIDES, ['A'], ['A', 'B', 'A', 'A'], []])
+def test_create_pptx_matches_python_pptx(slides):
+    # Create PowerPoints
+    expected, result = create_both(slides)
+
+    # Assert zip file is valid
+    assert result.testzip() is None
+
+    # Assert the same parts are created
+    assert sorted(result.namelist()) == sorted(expected.namelist())
+
+    # Assert parts are byte-for-byte identical, apart from content type order
+    for name in expected.namelist():
+        if name != '[Content_Types].xml':
+            assert result.read(name) == expected.read(name), name
+    assert content_types(result) == content_types(expected)
+
+def test_create_pptx_readable():
+    # Create PowerPoint
+    f = io.BytesIO()
+    fastpptx.create_pptx(SLIDES, f)
+
+    # Assert PowerPoint can be read and contains the slides
+    f.seek(0)
+    prs = core.pptx.Presentation(f)
+    assert [x.shapes[0].text_frame.text for x in prs.slides] == [
+        x.replace('\n', '\v').replace('\x01', '_x0001_') for x in SLIDES
+    ]
+
+def test_create_pptx_iterator(tmp_path):
+    # Create PowerPoint from a generator
+    path = str(tmp_path / 'slides.pptx')
+    fastpptx.create_pptx((x for x in ['A', 'B']), path)
+
+    # Assert PowerPoint contains the slides
+    prs = core.pptx.Presentation(path)
+    assert [x.shapes[0].text_frame.text for x in prs.slides] == ['A', 'B']
+
+def test_get_template_cached():
+    # Assert template is only rendered once
+    assert fastpptx.get_template() is fastpptx.get_template()
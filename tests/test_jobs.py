@@ -0,0 +1,102 @@
+import os
+import pytest
+import threading
+
+from songs2slides import jobs
+
+@pytest.fixture
+def store(tmp_path):
+    return jobs.JobStore(str(tmp_path), ttl=60)
+
+def wait(store):
+    # Wait for running jobs to finish
+    store._executor.shutdown(wait=True)
+
+def test_job_done(store):
+    # Submit job
+    job_id = store.submit(lambda x: x * 2, b'A')
+    wait(store)
+
+    # Assert result is stored
+    assert store.status(job_id) == 'done'
+    assert store.result(job_id) == b'AA'
+
+def test_job_pending(store):
+    # Submit job that doesn't finish until told to
+    release = threading.Event()
+    job_id = store.submit(lambda: release.wait(5) and b'A')
+
+    # Assert job is pending without a result
+    assert store.status(job_id) == 'pending'
+    assert store.result(job_id) is None
+
+    # Assert job is done once finished
+    release.set()
+    wait(store)
+    assert store.status(job_id) == 'done'
+    assert store.result(job_id) == b'A'
+
+def test_job_failed(store):
+    # Submit job that fails
+    def fail():
+        raise Exception('error')
+    job_id = store.submit(fail)
+    wait(store)
+
+    # Assert job failed without a result
+    assert store.status(job_id) == 'failed'
+    assert store.result(job_id) is None
+
+def test_job_queue_full(tmp_path):
+    # Create store that runs one job and queues one more
+    store = jobs.JobStore(str(tmp_path), max_workers=1, max_queue=2)
+    release = threading.Event()
+    store.submit(lambda: release.wait(5) and b'A')
+    store.submit(lambda: b'B')
+
+    # Assert further jobs are refused while the queue is full
+    with pytest.raises(jobs.JobQueueFull):
+        store.submit(lambda: b'C')
+
+    # Assert jobs are accepted again once the queue drains
+    release.set()
+    store._executor.submit(lambda: None).result()
+    job_id = store.submit(lambda: b'D')
+    wait(store)
+    assert store.result(job_id) == b'D'
+
+def test_job_kwargs(store):
+    # Submit job with keyword arguments
+    job_id = store.submit(lambda x, y: x + y, b'A', y=b'B')
+    wait(store)
+
+    # Assert result is stored
+    assert store.result(job_id) == b'AB'
+
+def test_job_shared(store, tmp_path):
+    # Submit job
+    job_id = store.submit(lambda: b'A')
+    wait(store)
+
+    # Assert job is available to other stores in the same directory
+    assert jobs.JobStore(str(tmp_path)).result(job_id) == b'A'
+
+def test_job_expired(store, tmp_path):
+    # Submit job and make it old
+    job_id = store.submit(lambda: b'A')
+    wait(store)
+    os.utime(tmp_path / f'{job_id}.done', (1000, 1000))
+
+    # Assert job has expired
+    assert store.status(job_id) is None
+    assert store.result(job_id) is None
+
+    # Assert expired jobs are removed
+    store.expire()
+    assert os.listdir(tmp_path) == []
+
+def test_job_unknown(store):
+    # Assert unknown and invalid job ids are not found
+    assert store.status('unknown') is None
+    assert store.status('../unknown') is None
+    assert store.result('unknown') is None
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import pytest
+
+from songs2slides import ratelimit
+
+@pytest.fixture
+def clock(mocker):
+    # Mock time.time and time.sleep
+    now = [1000.0]
+    mocker.patch('songs2slides.ratelimit.time.time', lambda: now[0])
+    mocker.patch('songs2slides.ratelimit.time.sleep')
+    return now
+
+def test_rate_limiter_is_abstract():
+    # Assert the base class can't be used as a rate limiter
+    with pytest.raises(TypeError):
+        ratelimit.RateLimiter(1)
+
+def test_rate_limiter_burst(clock):
+    # Create rate limiter
+    limiter = ratelimit.MemoryRateLimiter(2, burst=3)
+
+    # Reserve more requests than the burst
+    waits = [limiter.reserve() for _ in range(5)]
+
+    # Assert requests beyond the burst wait for refilled tokens
+    assert waits == [0, 0, 0, 0.5, 1]
+
+def test_rate_limiter_refill(clock):
+    # Create rate limiter and empty the bucket
+    limiter = ratelimit.MemoryRateLimiter(2, burst=2)
+    limiter.reserve()
+    limiter.reserve()
+
+    # Assert bucket is refilled over time, up to the burst
+    clock[0] += 0.5
+    assert limiter.reserve() == 0
+    clock[0] += 10
+    assert [limiter.reserve() for _ in range(3)] == [0, 0, 0.5]
+
+def test_rate_limiter_sheds(clock):
+    # Create rate limiter
+    limiter = ratelimit.MemoryRateLimiter(1, burst=1, max_wait=2)
+
+    # Reserve requests until one would wait too long
+    assert [limiter.reserve() for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ratelimit.RateLimited):
+        limiter.reserve()
+
+    # Assert shed requests don't take a token
+    clock[0] += 1
+    assert limiter.reserve() == 2
+
+def test_rate_limiter_acquire(clock):
+    # Create rate limiter and empty the bucket
+    limiter = ratelimit.MemoryRateLimiter(4, burst=1)
+    limiter.acquire()
+
+    # Acquire another token
+    limiter.acquire()
+
+    # Assert acquire waited for the token
+    assert ratelimit.time.sleep.call_args_list[-1].args == (0.25,)
+
+def test_rate_limiter_block(clock):
+    # Create rate limiter
+    limiter = ratelimit.MemoryRateLimiter(10, burst=10, max_wait=5)
+
+    # Block requests
+    limiter.block(3)
+
+    # Assert requests resume one at a time after the block
+    assert limiter.reserve() == 3
+    assert limiter.reserve() == pytest.approx(3.1)
+
+    # Assert a shorter block doesn't shorten the first
+    limiter.block(1)
+    assert limiter.reserve() == pytest.approx(3.2)
+
+    # Assert requests are shed while blocked for too long
+    limiter.block(10)
+    with pytest.raises(ratelimit.RateLimited):
+        limiter.reserve()
+
+def test_sqlite_rate_limiter_shared(clock, tmp_path):
+    # Create rate limiters sharing a database
+    path = str(tmp_path / 'rate.db')
+    first = ratelimit.SqliteRateLimiter(path, 1, burst=2, max_wait=10)
+    second = ratelimit.SqliteRateLimiter(path, 1, burst=2, max_wait=10)
+
+    # Assert limiters share the same bucket
+    assert first.reserve() == 0
+    assert second.reserve() == 0
+    assert first.reserve() == 1
+    second.block(5)
+    assert first.reserve() == 7
+
+@pytest.mark.parametrize('value, expected', [
+    (None, 1),
+    ('3', 3),
+    ('-3', 0),
+    ('soon', 1),
+])
+def test_parse_retry_after(value, expected):
+    assert ratelimit.parse_retry_after(value) == expected
+
+def test_parse_retry_after_date():
+    # Create date header
+    date = datetime.now(timezone.utc) + timedelta(seconds=30)
+    value = format_datetime(date, usegmt=True)
+
+    # Assert header is parsed
+    assert ratelimit.parse_retry_after(value) == pytest.approx(30, abs=2)
+
+def test_from_env(mocker, tmp_path):
+    # Mock environment
+    mocker.patch.dict('os.environ', { 'API_RATE': '5',
+                                      'API_RATE_MAX_WAIT': '2',
+                                      'API_RATE_PATH': str(tmp_path / 'r.db') })
+
+    # Create rate limiter
+    limiter = ratelimit.from_env()
+
+    # Assert options were read
+    assert isinstance(limiter, ratelimit.SqliteRateLimiter)
+    assert (limiter.rate, limiter.burst, limiter.max_wait) == (5, 5, 2)
+
+def test_from_env_provider(mocker, tmp_path):
+    # Mock environment
+    mocker.patch.dict('os.environ', { 'API_RATE': '5', 'API_RATE_2': '1',
+                                      'API_RATE_PATH': str(tmp_path / 'r.db') })
+
+    # Create rate limiters
+    first = ratelimit.from_env()
+    second = ratelimit.from_env(2)
+
+    # Assert each API has its own bucket
+    assert (first.name, first.rate) == ('api', 5)
+    assert (second.name, second.rate) == ('api_2', 1)
+
+def test_from_env_memory(mocker):
+    # Mock environment
+    mocker.patch.dict('os.environ', { 'API_RATE': '0.5', 'API_RATE_BURST': '3',
+                                      'API_RATE_PATH': '' })
+
+    # Create rate limiter
+    limiter = ratelimit.from_env()
+
+    # Assert options were read
+    assert isinstance(limiter, ratelimit.MemoryRateLimiter)
+    assert (limiter.rate, limiter.burst) == (0.5, 3)
+
+def test_from_env_disabled(monkeypatch):
+    # Mock environment
+    monkeypatch.delenv('API_RATE', raising=False)
+
+    # Assert no rate limiter is created
+    assert ratelimit.from_env() is None
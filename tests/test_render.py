@@ -0,0 +1,132 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import io
+import pytest
+import threading
+import time
+
+from songs2slides import core, render
+
+def test_render_pptx():
+    # Render PowerPoint
+    data = render.render_pptx(['A', 'B'])
+
+    # Assert PowerPoint contains the slides
+    prs = core.pptx.Presentation(io.BytesIO(data))
+    assert [x.shapes[0].text_frame.text for x in prs.slides] == ['A', 'B']
+
+def test_render_pool():
+    # Render PowerPoint in a worker process
+    pool = render.RenderPool(1)
+    try:
+        data = pool.render_pptx(['A', 'B'])
+    finally:
+        pool.shutdown()
+
+    # Assert PowerPoint is the same as when rendered in this process
+    assert data == render.render_pptx(['A', 'B'])
+
+def test_render_pool_worker_killed():
+    # Start a worker process, then kill it
+    pool = render.RenderPool(1)
+    try:
+        pool.render_pptx(['A'])
+        worker, = pool._executor._processes.values()
+        worker.kill()
+
+        # Wait for the pool to notice
+        with pytest.raises(BrokenProcessPool):
+            pool._executor.submit(int).result(10)
+
+        # Assert the next render starts new workers
+        data = pool.render_pptx(['A', 'B'])
+    finally:
+        pool.shutdown()
+    assert data == render.render_pptx(['A', 'B'])
+
+def test_render_pool_worker_died_while_rendering(mocker):
+    # Mock worker process that dies while rendering
+    pool = render.RenderPool(1)
+    pool.shutdown()
+    executor = mocker.patch.object(pool, '_executor')
+    future = Future()
+    future.set_exception(BrokenProcessPool())
+    executor.submit.return_value = future
+    mocker.patch.object(pool, '_start')
+
+    # Assert render fails and the workers are restarted
+    with pytest.raises(BrokenProcessPool):
+        pool.render_pptx(['A'])
+    executor.shutdown.assert_called_once()
+    assert pool._executor is pool._start.return_value
+
+def test_render_pool_queue_full(mocker):
+    # Mock worker processes that don't finish until told to
+    pool = render.RenderPool(1, max_queue=1, timeout=0.01)
+    pool.shutdown()
+    mocker.patch.object(pool, '_executor')
+    futures = []
+    def submit(*args):
+        futures.append(Future())
+        return futures[-1]
+    pool._executor.submit.side_effect = submit
+
+    # Assert first render times out and second is refused while it runs
+    with pytest.raises(TimeoutError):
+        pool.render_pptx(['A'])
+    with pytest.raises(render.RenderQueueFull):
+        pool.render_pptx(['B'])
+
+    # Assert renders are accepted again once the first one finishes
+    futures[0].set_result(b'A')
+    with pytest.raises(TimeoutError):
+        pool.render_pptx(['C'])
+    assert len(futures) == 2
+
+def test_render_pool_wait(mocker):
+    # Mock worker processes that don't finish until told to
+    pool = render.RenderPool(1, max_queue=1, timeout=0.01)
+    pool.shutdown()
+    mocker.patch.object(pool, '_executor')
+    futures = []
+    def submit(*args):
+        futures.append(Future())
+        return futures[-1]
+    pool._executor.submit.side_effect = submit
+
+    # Fill the queue, then render in the background while it is full
+    with pytest.raises(TimeoutError):
+        pool.render_pptx(['A'])
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(pool.render_pptx(['B'], wait=True)))
+    thread.start()
+
+    # Assert background render waits for a slot instead of being refused
+    time.sleep(0.05)
+    assert len(futures) == 1
+    futures[0].set_result(b'A')
+    while len(futures) < 2: time.sleep(0.01)
+
+    # Assert background render waits longer than the timeout
+    time.sleep(0.05)
+    assert thread.is_alive()
+    futures[1].set_result(b'B')
+    thread.join()
+    assert results == [b'B']
+
+def test_from_env(mocker):
+    # Mock os.getenv and RenderPool
+    mocker.patch('songs2slides.render.os.getenv')
+    mocker.patch('songs2slides.render.RenderPool')
+    env = {}
+    render.os.getenv.side_effect = lambda key, default=None: \
+        env.get(key, default)
+
+    # Assert render pool is disabled by default
+    assert render.from_env() is None
+
+    # Assert render pool is created when workers are set
+    env |= { 'RENDER_WORKERS': '2', 'RENDER_QUEUE': '3' }
+    assert render.from_env() is render.RenderPool.return_value
+    render.RenderPool.assert_called_with(2, max_queue=3, timeout=20)
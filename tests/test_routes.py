@@ -1,22 +1,28 @@
+from concurrent.futures.process import BrokenProcessPool
+import io
 import pytest
 
-from songs2slides import create_app, core, routes
+from songs2slides import cache, create_app, core, drafts, fastpptx, jobs, \
+    render, routes
 
 @pytest.fixture(autouse=True)
-def client():
+def client(tmp_path):
     app = create_app()
+    app.extensions['deck_cache'] = cache.FileCache(str(tmp_path / 'decks'))
+    app.extensions['export_jobs'] = jobs.JobStore(str(tmp_path / 'exports'))
+    app.extensions['drafts'] = drafts.DraftStore(str(tmp_path / 'drafts.db'))
     return app.test_client()
 
 def test_get_lyrics_basic(client, mocker):
-    # Mock get_song_data, parse_song_lyrics, and render_template
-    mocker.patch('songs2slides.core.get_song_data')
+    # Mock get_many_song_data, parse_song_lyrics, and render_template
+    mocker.patch('songs2slides.core.get_many_song_data')
     mocker.patch('songs2slides.core.parse_song_lyrics')
     mocker.patch('songs2slides.routes.render_template')
     songs = [
         core.SongData('T1', 'A1', 'L1'),
         core.SongData('T2', 'A2', 'L2'),
     ]
-    core.get_song_data.side_effect = songs
+    core.get_many_song_data.return_value = list(songs)
     core.parse_song_lyrics.side_effect = ['L1', 'L2']
 
     # Send request
@@ -28,9 +34,8 @@ def test_get_lyrics_basic(client, mocker):
     })
 
     # Assert mocks called correctly
-    core.get_song_data.assert_has_calls([
-        mocker.call('T1', 'A1'), mocker.call('T2', 'A2')
-    ])
+    core.get_many_song_data.assert_called_with([('T1', 'A1'), ('T2', 'A2')],
+                                               deadline=25)
     core.parse_song_lyrics.assert_has_calls([
         mocker.call('L1', 4), mocker.call('L2', 4)
     ])
@@ -38,15 +43,15 @@ def test_get_lyrics_basic(client, mocker):
                                               missing=0, api_error=False)
 
 def test_get_lyrics_one_error(client, mocker):
-    # Mock get_song_data, parse_song_lyrics, and render_template
-    mocker.patch('songs2slides.core.get_song_data')
+    # Mock get_many_song_data, parse_song_lyrics, and render_template
+    mocker.patch('songs2slides.core.get_many_song_data')
     mocker.patch('songs2slides.core.parse_song_lyrics')
     mocker.patch('songs2slides.routes.render_template')
     songs = [
         core.SongData('T1', 'A1', None),
         core.SongData('T2', 'A2', 'L2'),
     ]
-    core.get_song_data.side_effect = [Exception(), songs[1]]
+    core.get_many_song_data.return_value = [Exception(), songs[1]]
     core.parse_song_lyrics.side_effect = ['L1', 'L2']
 
     # Send request
@@ -58,16 +63,35 @@ def test_get_lyrics_one_error(client, mocker):
     })
 
     # Assert mocks called correctly
-    core.get_song_data.assert_has_calls([
-        mocker.call('T1', 'A1'), mocker.call('T2', 'A2')
-    ])
+    core.get_many_song_data.assert_called_with([('T1', 'A1'), ('T2', 'A2')],
+                                               deadline=25)
     core.parse_song_lyrics.assert_has_calls([mocker.call('L2', 4)])
     routes.render_template.assert_called_with('create-step-2.html', songs=songs,
                                               missing=1, api_error=False)
 
+def test_get_lyrics_api_error(client, mocker):
+    # Mock get_many_song_data and render_template
+    mocker.patch('songs2slides.core.get_many_song_data')
+    mocker.patch('songs2slides.routes.render_template')
+    core.get_many_song_data.return_value = [Exception(), core.SongNotFound()]
+
+    # Send request
+    client.post('/create/step-2/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'title-2': 'T2',
+        'artist-2': 'A2',
+    })
+
+    # Assert API error is only reported when every request fails
+    routes.render_template.assert_called_with('create-step-2.html', songs=[
+        core.SongData('T1', 'A1', None),
+        core.SongData('T2', 'A2', None),
+    ], missing=2, api_error=False)
+
 def test_get_lyrics_missing_artist(client, mocker):
-    # Mock get_song_data
-    mocker.patch('songs2slides.core.get_song_data')
+    # Mock get_many_song_data
+    mocker.patch('songs2slides.core.get_many_song_data')
 
     # Send request
     res = client.post('/create/step-2/', data={
@@ -77,7 +101,7 @@ def test_get_lyrics_missing_artist(client, mocker):
     })
 
     # Assert mocks not called
-    core.get_song_data.assert_not_called()
+    core.get_many_song_data.assert_not_called()
 
     # Assert response has 400 status code
     assert res.status_code == 400
@@ -98,17 +122,81 @@ def test_update_lyrics(client, mocker):
         'title-slides': 'on',
     })
 
+    # Assert render_template called with a draft of the songs
+    routes.render_template.assert_called_with('create-step-3.html',
+                                              draft=mocker.ANY)
+    draft_id = routes.render_template.call_args.kwargs['draft']
+    assert client.application.extensions['drafts'].get(draft_id) == [
+        core.SongData('T1', 'A1', 'L1'),
+        core.SongData('T2', 'A2', 'L2'),
+    ]
+
+def test_update_lyrics_no_drafts(client, mocker):
+    # Mock render_template and disable drafts
+    mocker.patch('songs2slides.routes.render_template')
+    client.application.extensions['drafts'] = None
+
+    # Send request
+    client.post('/create/step-3/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+    })
+
     # Assert render_template called correctly
     routes.render_template.assert_called_with('create-step-3.html', songs=[
         core.SongData('T1', 'A1', 'L1'),
-        core.SongData('T2', 'A2', 'L2'),
     ])
 
+def test_update_lyrics_sends_draft_id(client):
+    # Send request
+    res = client.post('/create/step-3/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+    })
+    html = res.get_data(as_text=True)
+
+    # Assert only the draft id is sent back
+    assert 'name="draft"' in html
+    assert 'lyrics-1' not in html
+
+def test_create_slides_draft(client, mocker):
+    # Mock stream_template and store draft
+    mocker.patch('songs2slides.routes.stream_template')
+    draft_id = client.application.extensions['drafts'].create([
+        core.SongData('T1', 'A1', 'L1'),
+    ])
+
+    # Send request
+    client.post('/slides/', data={
+        'draft': draft_id,
+        'output-type': 'html',
+        'title-slides': 'on',
+    })
+
+    # Assert slides are created from the draft
+    routes.stream_template.assert_called_with('slides.html',
+                                              slides=mocker.ANY)
+    slides = routes.stream_template.call_args.kwargs['slides']
+    assert list(slides) == ['T1', 'L1']
+
+def test_create_slides_draft_expired(client):
+    # Send request
+    res = client.post('/slides/', data={
+        'draft': 'unknown',
+        'output-type': 'html',
+    })
+
+    # Assert response has 404 status code
+    assert res.status_code == 404
+
 def test_create_slides_basic(client, mocker):
-    # Mock assemble_slides, create_pptx, and send_file
-    mocker.patch('songs2slides.core.assemble_slides')
-    mocker.patch('songs2slides.core.create_pptx')
+    # Mock iter_slides, create_pptx, and send_file
+    mocker.patch('songs2slides.core.iter_slides')
+    mocker.patch('songs2slides.fastpptx.create_pptx')
     mocker.patch('songs2slides.routes.send_file')
+    core.iter_slides.return_value = ['T1', 'L1', '', 'T2', 'L2']
 
     # Send request
     client.post('/slides/', data={
@@ -123,8 +211,9 @@ def test_create_slides_basic(client, mocker):
         'blank-slides': 'on',
     })
 
-    # Assert mocks called correctly
-    core.assemble_slides.assert_called_with([
+    # Assert mocks called correctly, assembling slides once for the key and
+    # once to render them
+    core.iter_slides.assert_called_with([
             core.SongData('T1', 'A1', 'L1'),
             core.SongData('T2', 'A2', 'L2'),
         ],
@@ -132,13 +221,98 @@ def test_create_slides_basic(client, mocker):
         title_slides = True,
         blank_slides = True,
     )
-    file = core.create_pptx.call_args.args[1]
-    routes.send_file.assert_called_with(file, as_attachment=True,
-                                   download_name='slides.pptx')
+    assert core.iter_slides.call_count == 2
+    assert fastpptx.create_pptx.call_args.args[0] is \
+        core.iter_slides.return_value
+    key = cache.make_deck_key(core.iter_slides.return_value,
+                              lines_per_slide=None, title_slides=True,
+                              blank_slides=True)
+    routes.send_file.assert_called_with(mocker.ANY, as_attachment=True,
+                                        download_name='slides.pptx', etag=key)
+
+def test_create_slides_cached(client, mocker):
+    # Mock create_pptx
+    mocker.patch('songs2slides.fastpptx.create_pptx',
+                 wraps=fastpptx.create_pptx)
+    data = {
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+        'output-type': 'pptx',
+        'title-slides': 'on',
+    }
+
+    # Send request twice
+    first = client.post('/slides/', data=data)
+    second = client.post('/slides/', data=data)
+
+    # Assert PowerPoint was only created once
+    fastpptx.create_pptx.assert_called_once()
+    assert first.data == second.data
+    assert first.headers['ETag'] == second.headers['ETag']
+
+def test_create_slides_not_modified(client, mocker):
+    # Mock create_pptx
+    mocker.patch('songs2slides.fastpptx.create_pptx')
+    key = cache.make_deck_key(['T1', 'L1'], lines_per_slide=None,
+                              title_slides=True, blank_slides=False)
+
+    # Send request with matching ETag
+    res = client.post('/slides/', headers={ 'If-None-Match': f'"{key}"' },
+                      data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+        'output-type': 'pptx',
+        'title-slides': 'on',
+    })
+
+    # Assert PowerPoint was not created
+    assert res.status_code == 304
+    assert res.headers['ETag'] == f'"{key}"'
+    fastpptx.create_pptx.assert_not_called()
+
+def test_create_slides_render_pool(client, mocker):
+    # Mock render pool
+    client.application.extensions['render_pool'] = mocker.Mock()
+    render_pool = client.application.extensions['render_pool']
+    render_pool.render_pptx.return_value = b'pptx'
+
+    # Send request
+    res = client.post('/slides/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+        'output-type': 'pptx',
+    })
+
+    # Assert PowerPoint was rendered by the pool
+    assert list(render_pool.render_pptx.call_args.args[0]) == ['L1']
+    assert res.data == b'pptx'
+
+@pytest.mark.parametrize('error', [render.RenderQueueFull(), TimeoutError(),
+                                   BrokenProcessPool()])
+def test_create_slides_render_pool_overloaded(client, mocker, error):
+    # Mock render pool
+    client.application.extensions['render_pool'] = mocker.Mock()
+    render_pool = client.application.extensions['render_pool']
+    render_pool.render_pptx.side_effect = error
+
+    # Send request
+    res = client.post('/slides/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+        'output-type': 'pptx',
+    })
+
+    # Assert response has 503 status code
+    assert res.status_code == 503
+    assert res.headers['Retry-After'] == '10'
 
 def test_create_slides_mising_artist(client, mocker):
-    # Mock assemble_slides
-    mocker.patch('songs2slides.core.assemble_slides')
+    # Mock iter_slides
+    mocker.patch('songs2slides.core.iter_slides')
 
     # Send request
     res = client.post('/slides/', data={
@@ -155,16 +329,16 @@ def test_create_slides_mising_artist(client, mocker):
     # Assert response has 400 status code
     assert res.status_code == 400
 
-    # Assert assemble_slides not called
-    core.assemble_slides.assert_not_called()
+    # Assert iter_slides not called
+    core.iter_slides.assert_not_called()
 
 def test_create_slides_html_slides(client, mocker):
-    # Mock assemble_slides, create_pptx, render_template
-    mocker.patch('songs2slides.core.assemble_slides')
-    mocker.patch('songs2slides.core.create_pptx')
-    mocker.patch('songs2slides.routes.render_template')
+    # Mock iter_slides, create_pptx, stream_template
+    mocker.patch('songs2slides.core.iter_slides')
+    mocker.patch('songs2slides.fastpptx.create_pptx')
+    mocker.patch('songs2slides.routes.stream_template')
     slides = ['T1', 'L1\nL2', 'L3', 'T2', 'L4']
-    core.assemble_slides.return_value = slides
+    core.iter_slides.return_value = slides
 
     # Send request
     client.post('/slides/', data={
@@ -180,7 +354,7 @@ def test_create_slides_html_slides(client, mocker):
     })
 
     # Assert mocks called correctly
-    core.assemble_slides.assert_called_with([
+    core.iter_slides.assert_called_with([
             core.SongData('T1', 'A1', 'L1'),
             core.SongData('T2', 'A2', 'L2'),
         ],
@@ -188,16 +362,16 @@ def test_create_slides_html_slides(client, mocker):
         title_slides = True,
         blank_slides = True,
     )
-    core.create_pptx.assert_not_called()
-    routes.render_template.assert_called_with('slides.html', slides=slides)
+    fastpptx.create_pptx.assert_not_called()
+    routes.stream_template.assert_called_with('slides.html', slides=slides)
 
 def test_create_slides_no_title_slides(client, mocker):
-    # Mock assemble_slides, create_pptx, render_template
-    mocker.patch('songs2slides.core.assemble_slides')
-    mocker.patch('songs2slides.core.create_pptx')
-    mocker.patch('songs2slides.routes.render_template')
+    # Mock iter_slides, create_pptx, stream_template
+    mocker.patch('songs2slides.core.iter_slides')
+    mocker.patch('songs2slides.fastpptx.create_pptx')
+    mocker.patch('songs2slides.routes.stream_template')
     slides = ['T1', 'L1\nL2', 'L3', 'T2', 'L4']
-    core.assemble_slides.return_value = slides
+    core.iter_slides.return_value = slides
 
     # Send request
     client.post('/slides/', data={
@@ -212,7 +386,7 @@ def test_create_slides_no_title_slides(client, mocker):
     })
 
     # Assert mocks called correctly
-    core.assemble_slides.assert_called_with([
+    core.iter_slides.assert_called_with([
             core.SongData('T1', 'A1', 'L1'),
             core.SongData('T2', 'A2', 'L2'),
         ],
@@ -220,16 +394,16 @@ def test_create_slides_no_title_slides(client, mocker):
         title_slides = False,
         blank_slides = True,
     )
-    core.create_pptx.assert_not_called()
-    routes.render_template.assert_called_with('slides.html', slides=slides)
+    fastpptx.create_pptx.assert_not_called()
+    routes.stream_template.assert_called_with('slides.html', slides=slides)
 
 def test_create_slides_no_blank_slides(client, mocker):
-    # Mock assemble_slides, create_pptx, render_template
-    mocker.patch('songs2slides.core.assemble_slides')
-    mocker.patch('songs2slides.core.create_pptx')
-    mocker.patch('songs2slides.routes.render_template')
+    # Mock iter_slides, create_pptx, stream_template
+    mocker.patch('songs2slides.core.iter_slides')
+    mocker.patch('songs2slides.fastpptx.create_pptx')
+    mocker.patch('songs2slides.routes.stream_template')
     slides = ['T1', 'L1\nL2', 'L3', 'T2', 'L4']
-    core.assemble_slides.return_value = slides
+    core.iter_slides.return_value = slides
 
     # Send request
     client.post('/slides/', data={
@@ -244,7 +418,7 @@ def test_create_slides_no_blank_slides(client, mocker):
     })
 
     # Assert mocks called correctly
-    core.assemble_slides.assert_called_with([
+    core.iter_slides.assert_called_with([
             core.SongData('T1', 'A1', 'L1'),
             core.SongData('T2', 'A2', 'L2'),
         ],
@@ -252,5 +426,336 @@ def test_create_slides_no_blank_slides(client, mocker):
         title_slides = True,
         blank_slides = False,
     )
-    core.create_pptx.assert_not_called()
-    routes.render_template.assert_called_with('slides.html', slides=slides)
+    fastpptx.create_pptx.assert_not_called()
+    routes.stream_template.assert_called_with('slides.html', slides=slides)
+
+def test_metrics(client, mocker):
+    # Mock lyrics cache and circuit breaker
+    mocker.patch('songs2slides.core.get_cache')
+    mocker.patch('songs2slides.core.get_breaker')
+    core.get_cache.return_value.stats.return_value = { 'hits': 1 }
+    core.get_breaker.return_value.stats.return_value = { 'state': 'open' }
+
+    # Send request
+    res = client.get('/api/metrics/')
+
+    # Assert response is correct
+    assert res.status_code == 200
+    assert res.json == { 'lyrics_cache': { 'hits': 1 },
+                         'circuit_breaker': { 'state': 'open' } }
+
+def test_prefetch(client, mocker):
+    # Mock prefetch_song_data
+    mocker.patch('songs2slides.core.prefetch_song_data')
+    core.prefetch_song_data.return_value = True
+
+    # Send request
+    res = client.post('/api/prefetch/', json={ 'title': 'T1', 'artist': 'A1' })
+
+    # Assert prefetch was queued
+    core.prefetch_song_data.assert_called_with('T1', 'A1')
+    assert res.status_code == 202
+    assert res.json == { 'queued': True }
+
+def test_prefetch_missing_artist(client, mocker):
+    # Mock prefetch_song_data
+    mocker.patch('songs2slides.core.prefetch_song_data')
+
+    # Send request
+    client.post('/api/prefetch/', json={ 'title': 'T1' })
+
+    # Assert artist defaults to an empty string
+    core.prefetch_song_data.assert_called_with('T1', '')
+
+def test_prefetch_missing_title(client, mocker):
+    # Mock prefetch_song_data
+    mocker.patch('songs2slides.core.prefetch_song_data')
+
+    # Send requests
+    responses = [
+        client.post('/api/prefetch/', json={ 'artist': 'A1' }),
+        client.post('/api/prefetch/', json={ 'title': ' ', 'artist': 'A1' }),
+        client.post('/api/prefetch/', json=['T1', 'A1']),
+        client.post('/api/prefetch/', data='T1'),
+    ]
+
+    # Assert prefetch not called
+    core.prefetch_song_data.assert_not_called()
+
+    # Assert responses have 400 status codes
+    assert [x.status_code for x in responses] == [400] * 4
+
+def test_get_lyrics_stream(client, mocker):
+    # Mock iter_many_song_data
+    mocker.patch('songs2slides.core.iter_many_song_data')
+    core.iter_many_song_data.return_value = [
+        (1, core.SongData('T2', 'A2', 'L2\n\n\nL3')),
+        (0, Exception()),
+    ]
+
+    # Send request
+    res = client.post('/create/step-2/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'title-2': 'T2',
+        'artist-2': 'A2',
+        'stream': 'on',
+    })
+    html = res.get_data(as_text=True)
+
+    # Assert mocks called correctly
+    core.iter_many_song_data.assert_called_with([('T1', 'A1'), ('T2', 'A2')],
+                                                deadline=25)
+
+    # Assert songs are rendered in the order they were found
+    assert res.status_code == 200
+    assert html.index('name="lyrics-2"') < html.index('name="lyrics-1"')
+    assert 'style="order: 2"' in html
+    assert '>L2\n\n\n\nL3</textarea>' in html
+
+    # Assert missing message is rendered after all songs
+    assert html.index('name="lyrics-1"') < html.index('id="missing-count"')
+    assert '<span id="missing-count">1</span>' in html
+
+def test_get_lyrics_stream_config(mocker):
+    # Mock os.getenv
+    mocker.patch('songs2slides.os.getenv')
+    import songs2slides
+    songs2slides.os.getenv.side_effect = lambda key, default=None: \
+        'on' if key == 'STREAM_LYRICS' else default
+
+    # Send request
+    res = create_app().test_client().get('/create/step-1/')
+
+    # Assert step 1 form requests streaming
+    assert 'name="stream"' in res.get_data(as_text=True)
+
+def test_create_app_bad_rules(monkeypatch):
+    # Mock environment
+    monkeypatch.setenv('LYRICS_RULES', 'unknown')
+
+    # Assert bad lyrics rules fail at startup instead of on each lookup
+    with pytest.raises(ValueError):
+        create_app()
+
+def test_create_slides_pptx_download(client):
+    # Send request
+    res = client.post('/slides/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+        'output-type': 'pptx',
+        'title-slides': 'on',
+    })
+
+    # Assert PowerPoint is sent as an attachment
+    assert res.status_code == 200
+    assert res.headers['Content-Disposition'] == \
+        'attachment; filename=slides.pptx'
+    assert res.mimetype == 'application/' \
+        'vnd.openxmlformats-officedocument.presentationml.presentation'
+    assert res.data[:2] == b'PK'
+
+def test_export(client):
+    # Start export
+    res = client.post('/exports/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+        'title-slides': 'on',
+    })
+    job_id = res.json['id']
+
+    # Assert job was started
+    assert res.status_code == 202
+    assert res.json['status_url'] == f'/exports/{job_id}/'
+    assert res.headers['Location'] == f'/exports/{job_id}/'
+
+    # Wait for job to finish
+    client.application.extensions['export_jobs']._executor.shutdown(wait=True)
+
+    # Assert job is done
+    res = client.get(f'/exports/{job_id}/')
+    assert res.json == {
+        'id': job_id,
+        'status': 'done',
+        'download_url': f'/exports/{job_id}/slides.pptx',
+    }
+
+    # Assert PowerPoint can be downloaded
+    res = client.get(f'/exports/{job_id}/slides.pptx')
+    assert res.headers['Content-Disposition'] == \
+        'attachment; filename=slides.pptx'
+    prs = core.pptx.Presentation(io.BytesIO(res.data))
+    assert [x.shapes[0].text_frame.text for x in prs.slides] == ['T1', 'L1']
+
+def test_export_render_pool(client, mocker):
+    # Mock render pool
+    client.application.extensions['render_pool'] = mocker.Mock()
+    render_pool = client.application.extensions['render_pool']
+    render_pool.render_pptx.return_value = b'pptx'
+
+    # Start export and wait for it to finish
+    res = client.post('/exports/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+    })
+    client.application.extensions['export_jobs']._executor.shutdown(wait=True)
+
+    # Assert export waited for the render pool instead of timing out
+    assert render_pool.render_pptx.call_args.kwargs == { 'wait': True }
+    assert client.get(f'/exports/{res.json["id"]}/slides.pptx').data == \
+        b'pptx'
+
+def test_export_queue_full(client, mocker):
+    # Mock job store
+    client.application.extensions['export_jobs'] = mocker.Mock()
+    client.application.extensions['export_jobs'].submit.side_effect = \
+        jobs.JobQueueFull()
+
+    # Start export
+    res = client.post('/exports/', data={
+        'title-1': 'T1',
+        'artist-1': 'A1',
+        'lyrics-1': 'L1',
+    })
+
+    # Assert response has 503 status code
+    assert res.status_code == 503
+    assert res.headers['Retry-After'] == '10'
+
+def test_export_pending(client, mocker):
+    # Mock job store
+    client.application.extensions['export_jobs'] = mocker.Mock()
+    client.application.extensions['export_jobs'].status.return_value = \
+        'pending'
+    client.application.extensions['export_jobs'].result.return_value = None
+
+    # Assert job is pending and can't be downloaded
+    assert client.get('/exports/abc/').json == {
+        'id': 'abc',
+        'status': 'pending',
+    }
+    assert client.get('/exports/abc/slides.pptx').status_code == 404
+
+def test_export_unknown(client):
+    # Assert unknown jobs are not found
+    assert client.get('/exports/unknown/').status_code == 404
+    assert client.get('/exports/unknown/slides.pptx').status_code == 404
+
+def test_export_missing_artist(client):
+    # Send request
+    res = client.post('/exports/', data={
+        'title-1': 'T1',
+        'lyrics-1': 'L1',
+    })
+
+    # Assert response has 400 status code
+    assert res.status_code == 400
+
+def test_api_slides(client, mocker):
+    # Mock get_many_song_data
+    mocker.patch('songs2slides.core.get_many_song_data')
+    core.get_many_song_data.return_value = [
+        core.SongData('Title 2', 'Artist 2', 'L3\nL4'),
+    ]
+
+    # Send request
+    res = client.post('/api/slides/', json={
+        'songs': [
+            { 'title': 'T1', 'artist': 'A1', 'lyrics': 'L1\nL2' },
+            { 'title': 'T2', 'artist': 'A2' },
+        ],
+        'lines_per_slide': 1,
+        'blank_slides': False,
+    })
+
+    # Assert only missing lyrics were looked up
+    core.get_many_song_data.assert_called_with([('T2', 'A2')], deadline=25)
+
+    # Assert slides are correct
+    assert res.status_code == 200
+    assert res.json == {
+        'slides': ['T1', 'L1', 'L2', 'TITLE 2', 'L3', 'L4'],
+    }
+
+def test_api_slides_pptx(client):
+    # Send request
+    res = client.post('/api/slides/', json={
+        'songs': [{ 'title': 'T1', 'lyrics': 'L1' }],
+        'output_type': 'pptx',
+    })
+
+    # Assert PowerPoint is correct
+    assert res.headers['Content-Disposition'] == \
+        'attachment; filename=slides.pptx'
+    assert res.headers['ETag'] == '"{}"'.format(cache.make_deck_key(
+        ['T1', 'L1'], lines_per_slide=4, title_slides=True, blank_slides=True))
+    prs = core.pptx.Presentation(io.BytesIO(res.data))
+    assert [x.shapes[0].text_frame.text for x in prs.slides] == ['T1', 'L1']
+
+def test_api_slides_missing_lyrics(client, mocker):
+    # Mock get_many_song_data
+    mocker.patch('songs2slides.core.get_many_song_data')
+    core.get_many_song_data.return_value = [
+        core.SongNotFound(),
+        core.SongData('T2', 'A2', 'L2'),
+        core.SongNotFound(),
+    ]
+
+    # Send request
+    res = client.post('/api/slides/', json={
+        'songs': [{ 'title': f'T{i}' } for i in range(1, 4)],
+    })
+
+    # Assert missing songs are reported
+    assert res.status_code == 422
+    assert res.json == { 'error': 'Lyrics not found', 'missing': [0, 2] }
+
+@pytest.mark.parametrize('error', [
+    Exception('API error'),
+    TimeoutError('Lookup deadline exceeded'),
+    core.breaker.CircuitOpen(),
+])
+def test_api_slides_api_error(client, mocker, error):
+    # Mock get_many_song_data
+    mocker.patch('songs2slides.core.get_many_song_data')
+    core.get_many_song_data.return_value = [
+        core.SongNotFound(),
+        core.SongData('T2', 'A2', 'L2'),
+        error,
+    ]
+
+    # Send request
+    res = client.post('/api/slides/', json={
+        'songs': [{ 'title': f'T{i}' } for i in range(1, 4)],
+    })
+
+    # Assert failed songs are reported apart from missing ones
+    assert res.status_code == 503
+    assert res.headers['Retry-After'] == '10'
+    assert res.json == { 'error': 'Lyrics API unavailable', 'failed': [2],
+                         'missing': [0] }
+
+@pytest.mark.parametrize('data', [
+    ['T1'],
+    {},
+    { 'songs': ['T1'] },
+    { 'songs': [{ 'artist': 'A1' }] },
+    { 'songs': [{ 'title': 'T1', 'lyrics': 1 }] },
+    { 'songs': [], 'lines_per_slide': 0 },
+    { 'songs': [], 'lines_per_slide': True },
+    { 'songs': [], 'title_slides': 'yes' },
+    { 'songs': [], 'output_type': 'html' },
+])
+def test_api_slides_invalid(client, mocker, data):
+    # Mock get_many_song_data
+    mocker.patch('songs2slides.core.get_many_song_data')
+
+    # Send request
+    res = client.post('/api/slides/', json=data)
+
+    # Assert response has 400 status code
+    assert res.status_code == 400
+    core.get_many_song_data.assert_not_called()
@@ -0,0 +1,106 @@
+import json
+import pytest
+
+from songs2slides import rules
+
+def test_rule_set_applies_rules_in_order():
+    # Create rule set
+    rule_set = rules.RuleSet([
+        rules.Rule('a', 'b'),
+        rules.Rule('B+', 'c', flags='i'),
+    ])
+
+    # Assert rules are applied in order
+    assert rule_set.apply(' aAb ') == 'cAc'
+
+def test_rule_set_empty():
+    # Assert lyrics are unchanged
+    assert rules.RuleSet([]).apply(' L1\n') == ' L1\n'
+
+def test_section_headers():
+    # Declare raw lyrics and expected cleaned lyrics
+    lyrics = 'Verse 1:\nL1\n\nChorus\nL2\n\nBRIDGE: L3\nVerses are L4'
+    expected = 'L1\n\nL2\n\nL3\nVerses are L4'
+
+    # Clean lyrics
+    rule_set = rules.RuleSet(rules.BUILT_IN['section-headers'])
+    result = rule_set.apply(lyrics)
+
+    # Assert lyrics are correct
+    assert result == expected
+
+def test_repeat_markers():
+    # Declare raw lyrics and expected cleaned lyrics
+    lyrics = 'L1 x2\nL2 (2x)\nx3\nL3\nL4x2\nL5 × 4'
+    expected = 'L1\nL2\nL3\nL4x2\nL5'
+
+    # Clean lyrics
+    rule_set = rules.RuleSet(rules.BUILT_IN['repeat-markers'])
+    result = rule_set.apply(lyrics)
+
+    # Assert lyrics are correct
+    assert result == expected
+
+def test_credits():
+    # Declare raw lyrics and expected cleaned lyrics
+    lyrics = 'L1\nWritten by me\nL2\n\nWritten by A\nMusic: B\n\n© 2020 C\n'
+    expected = 'L1\nWritten by me\nL2'
+
+    # Clean lyrics
+    rule_set = rules.RuleSet(rules.BUILT_IN['credits'])
+    result = rule_set.apply(lyrics)
+
+    # Assert lyrics are correct
+    assert result == expected
+
+def test_get_rule_set_cached():
+    # Get rule set twice
+    first = rules.get_rule_set((rules.Rule('a'),))
+    second = rules.get_rule_set((rules.Rule('a'),))
+
+    # Assert rule set was only compiled once
+    assert first is second
+    assert first is not rules.get_rule_set((rules.Rule('b'),))
+
+def test_parse_rules():
+    # Parse rules
+    result = rules.parse_rules([
+        'credits',
+        { 'pattern': 'a', 'replacement': 'b', 'flags': 'i' },
+    ])
+
+    # Assert rules are correct
+    assert result == rules.BUILT_IN['credits'] + (rules.Rule('a', 'b', 'i'),)
+
+@pytest.mark.parametrize('config', [
+    ['unknown'],
+    [{ 'replacement': 'b' }],
+    [{ 'pattern': 'a', 'flags': 'x' }],
+    [{ 'pattern': '(' }],
+    [{ 'pattern': 'a', 'replacement': r'\2' }],
+    [{ 'pattern': 1 }],
+    [1],
+])
+def test_parse_rules_invalid(config):
+    # Assert invalid rules are rejected
+    with pytest.raises(ValueError):
+        rules.parse_rules(config)
+
+def test_from_env(tmp_path, monkeypatch):
+    # Write rules file
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps([{ 'pattern': '^Solo:.*\n', 'flags': 'm' }]))
+    monkeypatch.setenv('LYRICS_RULES', f'repeat-markers, {path}')
+
+    # Load rule set
+    rule_set = rules.from_env()
+
+    # Assert rules are loaded in order
+    assert rule_set.rules == rules.BUILT_IN['repeat-markers'] + \
+        (rules.Rule('^Solo:.*\n', flags='m'),)
+    assert rule_set.apply('L1 x2\nSolo: A\nL2') == 'L1\nL2'
+
+def test_from_env_not_set(monkeypatch):
+    # Assert rule set is empty
+    monkeypatch.delenv('LYRICS_RULES', raising=False)
+    assert rules.from_env().rules == ()